@@ -0,0 +1,267 @@
+"""
+Local stand-ins for Alpha Vantage and yfinance, for load-testing the collectors offline.
+
+FakeAlphaVantageServer serves the same JSON shapes as the INCOME_STATEMENT, BALANCE_SHEET
+and CASH_FLOW endpoints on a local port; FakeYFinance answers `download` and `Ticker`
+like the yfinance module. Both generate deterministic synthetic data for any ticker and
+can inject latency, errors and rate limiting.
+
+    with FakeAlphaVantageServer(latency_ms=50, error_rate=0.02, requests_per_minute=600) as server:
+        fetch_statements(tickers, 'demo', base_url=server.base_url)
+
+    with fake_yfinance(FakeYFinance(latency_ms=20)):
+        fetch_stock_data('T0001')
+"""
+
+import contextlib
+import json
+import random
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import ModuleType
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_data import BASE_DAILY_ROWS
+from src.data_pipeline.fetch_engine import TokenBucket
+
+# Fields per statement, named like the real responses; the padding fields mimic the
+# ~30 mostly unused columns each real statement carries
+STATEMENT_FIELDS = {
+    'INCOME_STATEMENT': ['grossProfit', 'totalRevenue', 'costOfRevenue', 'operatingIncome',
+                         'researchAndDevelopment', 'operatingExpenses', 'incomeBeforeTax',
+                         'incomeTaxExpense', 'netIncome', 'ebit', 'ebitda'],
+    'BALANCE_SHEET': ['totalAssets', 'totalCurrentAssets', 'cashAndCashEquivalentsAtCarryingValue',
+                      'inventory', 'totalLiabilities', 'longTermDebt', 'shortTermDebt',
+                      'totalShareholderEquity', 'retainedEarnings', 'commonStockSharesOutstanding'],
+    'CASH_FLOW': ['operatingCashflow', 'capitalExpenditures', 'changeInInventory',
+                  'cashflowFromInvestment', 'cashflowFromFinancing', 'dividendPayout',
+                  'paymentsForRepurchaseOfCommonStock', 'changeInCashAndCashEquivalents'],
+}
+PADDING_FIELDS = 20
+DEFAULT_REPORTS = 80
+# Share of values reported as the string "None", as Alpha Vantage does for missing items
+MISSING_RATE = 0.05
+THROTTLE_MESSAGE = ("Thank you for using Alpha Vantage! Our standard API rate limit is "
+                    "25 requests per day.")
+
+
+def _seed(*parts):
+    return zlib.crc32('|'.join(map(str, parts)).encode('utf-8'))
+
+
+def statement_payload(symbol, function, n_reports=DEFAULT_REPORTS, end_date='2025-07-31'):
+    """A deterministic synthetic Alpha Vantage statement payload for any ticker."""
+    rng = np.random.default_rng(_seed(symbol, function))
+    dates = pd.date_range(end=end_date, periods=n_reports, freq=pd.offsets.QuarterEnd())
+    fields = STATEMENT_FIELDS[function] + [f'otherItem{i}' for i in range(PADDING_FIELDS)]
+    scale = np.exp(np.cumsum(rng.normal(0.04, 0.08, size=n_reports)))[:, None]
+    values = (rng.uniform(1e7, 5e9, size=(n_reports, len(fields))) * scale).astype(np.int64)
+    missing = rng.random(values.shape) < MISSING_RATE
+
+    reports = []
+    for date, row, row_missing in zip(dates[::-1], values[::-1], missing[::-1]):
+        report = {'fiscalDateEnding': date.strftime('%Y-%m-%d'), 'reportedCurrency': 'USD'}
+        report.update({field: 'None' if gap else str(value) for field, value, gap in zip(fields, row, row_missing)})
+        reports.append(report)
+    return {'symbol': symbol, 'annualReports': [], 'quarterlyReports': reports}
+
+
+class FaultInjector:
+    """Latency, error-rate and rate-limit injection shared by the fake providers."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, requests_per_minute=None, seed=0):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'throttled': 0, 'errors': 0}
+
+    def _record(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def admit(self):
+        """Sleeps for the injected latency and returns 'throttled', 'error' or None."""
+        self._record('requests')
+        with self.lock:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            failed = self.random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if self.bucket is not None and not self.bucket.try_acquire():
+            self._record('throttled')
+            return 'throttled'
+        if failed:
+            self._record('errors')
+            return 'error'
+        return None
+
+
+class FakeAlphaVantageServer(FaultInjector):
+    """
+    Serves GET /query?function=...&symbol=...&apikey=... on a local port like Alpha Vantage.
+    Throttled calls get HTTP 200 with an 'Information' message, injected errors HTTP 503.
+    Use as a context manager; `base_url` points fetch_statements at it.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, n_reports=DEFAULT_REPORTS, **faults):
+        super().__init__(**faults)
+        self.n_reports = n_reports
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/query"
+
+    def _make_handler(self):
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if url.path != '/query':
+                    return self._send(404, {'Error Message': f"Unknown path {url.path}"})
+
+                outcome = provider.admit()
+                if outcome == 'throttled':
+                    return self._send(200, {'Information': THROTTLE_MESSAGE})
+                if outcome == 'error':
+                    return self._send(503, {'Error Message': "Injected server error"})
+
+                function, symbol = params.get('function'), params.get('symbol')
+                if function not in STATEMENT_FIELDS or not symbol:
+                    return self._send(200, {'Error Message': "Invalid API call."})
+                self._send(200, statement_payload(symbol, function, provider.n_reports))
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='fake-alpha-vantage', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeYFinance(FaultInjector):
+    """
+    Answers `download(symbol, start, end)` with yfinance's MultiIndex price frame and
+    `Ticker(symbol)` with annual statement frames. Throttled and failed calls raise,
+    as the real library does on rate limits and network errors.
+    """
+
+    def __init__(self, n_days=BASE_DAILY_ROWS, end_date='2025-09-05', **faults):
+        super().__init__(**faults)
+        # The business-day calendar is built once; generating it per call would dominate the load test
+        self.dates = pd.bdate_range(end=end_date, periods=n_days, name='Date')
+
+    def _check(self, symbol):
+        outcome = self.admit()
+        if outcome == 'throttled':
+            raise RuntimeError(f"Too Many Requests. Rate limited. ({symbol})")
+        if outcome == 'error':
+            raise ConnectionError(f"Injected network error ({symbol})")
+
+    def download(self, symbol, start=None, end=None, **kwargs):
+        self._check(symbol)
+        rng = np.random.default_rng(_seed(symbol, 'prices'))
+        close = 5.0 * np.exp(np.cumsum(rng.normal(0.0005, 0.025, size=len(self.dates))))
+        volume = rng.lognormal(mean=18, sigma=0.6, size=len(self.dates)).astype(np.int64)
+        mask = np.ones(len(self.dates), dtype=bool)
+        if start is not None:
+            mask &= self.dates >= pd.Timestamp(start)
+        if end is not None:
+            mask &= self.dates < pd.Timestamp(end)
+        close, volume = close[mask], volume[mask]
+        frame = pd.DataFrame({
+            ('Close', symbol): close, ('High', symbol): close * 1.01, ('Low', symbol): close * 0.99,
+            ('Open', symbol): close, ('Volume', symbol): volume,
+        }, index=self.dates[mask])
+        frame.columns = pd.MultiIndex.from_tuples(frame.columns, names=['Price', 'Ticker'])
+        return frame
+
+    def Ticker(self, symbol):
+        return _FakeTicker(self, symbol)
+
+
+class _FakeTicker:
+    """yfinance.Ticker stand-in: annual statements with line items as rows, dates as columns."""
+
+    ITEMS = {
+        'financials': ['Total Revenue', 'Gross Profit', 'Operating Income', 'Net Income'],
+        'balance_sheet': ['Total Assets', 'Total Liabilities Net Minority Interest', 'Stockholders Equity'],
+        'cashflow': ['Operating Cash Flow', 'Capital Expenditure', 'Free Cash Flow'],
+    }
+
+    def __init__(self, provider, symbol):
+        self.provider = provider
+        self.symbol = symbol
+
+    def _statement(self, name):
+        self.provider._check(self.symbol)
+        rng = np.random.default_rng(_seed(self.symbol, name))
+        dates = pd.date_range(end='2025-01-31', periods=4, freq=pd.offsets.YearEnd(month=1))[::-1]
+        values = rng.uniform(1e8, 5e10, size=(len(self.ITEMS[name]), len(dates)))
+        return pd.DataFrame(values, index=self.ITEMS[name], columns=dates)
+
+    @property
+    def financials(self):
+        return self._statement('financials')
+
+    @property
+    def balance_sheet(self):
+        return self._statement('balance_sheet')
+
+    @property
+    def cashflow(self):
+        return self._statement('cashflow')
+
+
+@contextlib.contextmanager
+def fake_yfinance(provider):
+    """Makes `import yfinance` inside the collectors return `provider` for the duration."""
+    module = ModuleType('yfinance')
+    module.download = provider.download
+    module.Ticker = provider.Ticker
+    original = sys.modules.get('yfinance')
+    sys.modules['yfinance'] = module
+    try:
+        yield provider
+    finally:
+        if original is None:
+            sys.modules.pop('yfinance', None)
+        else:
+            sys.modules['yfinance'] = original
@@ -0,0 +1,111 @@
+"""
+Offline load test of the collectors against the local fake providers.
+
+Starts a FakeAlphaVantageServer, fetches every statement for N synthetic tickers through
+fetch_engine.fetch_statements at each worker count, then downloads their prices through
+fetch_stock_data with FakeYFinance in place of yfinance. Reports throughput, failures and
+the throttling/error counts the providers saw, so worker counts and client rate limits
+can be tuned without a network.
+
+    python -m benchmarks.load_test --tickers 1000 --workers 4 16 64 --latency-ms 80 --error-rate 0.01
+    python -m benchmarks.load_test --tickers 200 --server-rpm 600 --client-rpm 550
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_provider import DEFAULT_REPORTS, FakeAlphaVantageServer, FakeYFinance, fake_yfinance
+from benchmarks.synthetic_data import synthetic_tickers
+from src.data_pipeline import fetch_engine, response_cache
+from src.data_pipeline.response_cache import ResponseCache
+from src.data_pipeline.stock_data_collector import fetch_stock_data
+
+DEFAULT_WORKERS = (4, 16)
+
+
+def _report(label, n_jobs, n_ok, seconds, stats):
+    print(f"{label:<28} {n_ok:>6}/{n_jobs:<6} ok {seconds:9.2f}s {n_jobs / seconds if seconds else 0:10.1f} req/s "
+          f"| server: {stats['requests']} requests, {stats['throttled']} throttled, {stats['errors']} errors")
+
+
+def load_test_statements(tickers, workers, client_rpm, workdir, n_reports=DEFAULT_REPORTS, **faults):
+    """Cold statement fetches for every ticker at one worker count; returns a result record."""
+    cache = ResponseCache(cache_dir=os.path.join(workdir, f'cache_statements_{workers}'), offline=False)
+    with FakeAlphaVantageServer(n_reports=n_reports, **faults) as server:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = fetch_engine.fetch_statements(tickers, 'load-test', base_url=server.base_url,
+                                                    requests_per_minute=client_rpm, max_workers=workers,
+                                                    cache=cache)
+        seconds = time.perf_counter() - start
+        stats = dict(server.stats)
+
+    n_ok = sum(payload is not None for payload in results.values())
+    _report(f"statements workers={workers}", len(results), n_ok, seconds, stats)
+    return {'stage': 'statements', 'workers': workers, 'jobs': len(results), 'ok': n_ok,
+            'seconds': round(seconds, 3), **stats}
+
+
+def load_test_prices(tickers, workers, workdir, **faults):
+    """Cold price downloads for every ticker through fetch_stock_data on a thread pool."""
+    provider = FakeYFinance(**faults)
+    # fetch_stock_data uses the process-wide response cache; point it at a scratch directory
+    response_cache._default_cache = ResponseCache(cache_dir=os.path.join(workdir, f'cache_prices_{workers}'),
+                                                  offline=False)
+    try:
+        with fake_yfinance(provider), contextlib.redirect_stdout(io.StringIO()), \
+                ThreadPoolExecutor(max_workers=workers) as executor:
+            start = time.perf_counter()
+            frames = list(executor.map(fetch_stock_data, tickers))
+            seconds = time.perf_counter() - start
+    finally:
+        response_cache._default_cache = None
+
+    n_ok = sum(not df.empty for df in frames)
+    _report(f"prices workers={workers}", len(frames), n_ok, seconds, provider.stats)
+    return {'stage': 'prices', 'workers': workers, 'jobs': len(frames), 'ok': n_ok,
+            'seconds': round(seconds, 3), **provider.stats}
+
+
+def run_load_test(n_tickers, worker_counts=DEFAULT_WORKERS, client_rpm=1e9, stages=('statements', 'prices'),
+                  n_reports=DEFAULT_REPORTS, **faults):
+    """Runs the selected stages at every worker count and returns one record per run."""
+    tickers = synthetic_tickers(n_tickers)
+    records = []
+    with tempfile.TemporaryDirectory(prefix='moat_load_') as workdir:
+        for workers in worker_counts:
+            if 'statements' in stages:
+                records.append(load_test_statements(tickers, workers, client_rpm, workdir, n_reports, **faults))
+            if 'prices' in stages:
+                records.append(load_test_prices(tickers, workers, workdir, **faults))
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the data collectors.")
+    parser.add_argument('--tickers', type=int, default=100, help="Synthetic tickers to fetch.")
+    parser.add_argument('--workers', type=int, nargs='+', default=list(DEFAULT_WORKERS), help="Worker counts to try.")
+    parser.add_argument('--stages', nargs='+', choices=('statements', 'prices'), default=['statements', 'prices'])
+    parser.add_argument('--reports', type=int, default=DEFAULT_REPORTS, help="Quarterly reports per statement.")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Injected response latency.")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="Uniform extra latency on top.")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests that fail.")
+    parser.add_argument('--server-rpm', type=float, help="Provider-side rate limit (requests/minute).")
+    parser.add_argument('--client-rpm', type=float, default=1e9, help="fetch_engine's client-side rate limit.")
+    parser.add_argument('--backoff-seconds', type=float, default=fetch_engine.BACKOFF_BASE_SECONDS,
+                        help="Base retry backoff of fetch_engine.")
+    args = parser.parse_args()
+
+    fetch_engine.BACKOFF_BASE_SECONDS = args.backoff_seconds
+    run_load_test(args.tickers, args.workers, args.client_rpm, args.stages, args.reports,
+                  latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                  requests_per_minute=args.server_rpm)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+Offline benchmarks for every pipeline stage.
+
+Runs the fetch engine, the Year/Quarter parsing and as-of price alignment,
+run_forecasting_model and two_stage_forecast on synthetic data at several row scales
+and ticker counts, and reports wall time, throughput and peak memory per stage.
+Every stage runs twice from a cold start: once timed, once with its peak RSS sampled
+across this process and its workers (joblib/loky), so sampling never skews the timings.
+Memory sampling uses psutil when installed, else the resource module's peak RSS.
+Results are saved as JSON under benchmarks/results/ so runs can be compared across commits.
+
+    python -m benchmarks.run_benchmarks --scales 1 10 100 --tickers 1 5
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/<previous>.json
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+try:
+    import psutil
+except ImportError:  # peak RSS then comes from the resource module
+    psutil = None
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from benchmarks.synthetic_data import (
+    BASE_DAILY_ROWS,
+    BASE_QUARTERLY_ROWS,
+    synthetic_kpi_data,
+    synthetic_statement_payload,
+    synthetic_stock_data,
+    synthetic_tickers,
+)
+from src.data_pipeline import fetch_engine
+from src.data_pipeline.data_processor import process_data
+from src.data_pipeline.response_cache import ResponseCache
+from src.machine_learning import model_registry
+from src.machine_learning.forecasting_engine import run_forecasting_model
+from src.machine_learning.two_stage_forecast import two_stage_forecast
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+STAGES = ('fetch', 'prepare', 'forecasting_engine', 'two_stage_forecast')
+# Scale 10 alone takes minutes per forecasting stage on one core; pass --scales for larger runs
+DEFAULT_SCALES = (1, 2)
+# How often the memory pass samples the RSS of this process and its workers
+RSS_SAMPLE_SECONDS = 0.02
+DEFAULT_TICKERS = (1,)
+
+
+class _StubResponse:
+    status_code = 200
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        # Round-trip through JSON text so decoding cost is part of the measurement
+        return json.loads(json.dumps(self.payload))
+
+
+class _StubSession:
+    """Answers Alpha Vantage requests from synthetic payloads instead of the network."""
+
+    def __init__(self, n_reports):
+        self.n_reports = n_reports
+
+    def get(self, url, params=None, timeout=None):
+        return _StubResponse(synthetic_statement_payload(params['symbol'], self.n_reports))
+
+
+def _tree_rss(process):
+    """Resident memory of a process and all of its descendants, in bytes."""
+    total = 0
+    for proc in [process] + process.children(recursive=True):
+        try:
+            total += proc.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return total
+
+
+def _peak_rss_mib(fn):
+    """
+    Runs fn and returns the peak RSS in MiB of this process plus its child processes.
+    With psutil the process tree is sampled while fn runs; otherwise the peaks of
+    resource.getrusage for this process and its reaped children are added up, which
+    includes anything this process allocated before fn.
+    """
+    if psutil is not None:
+        process, peak, done = psutil.Process(), [0], threading.Event()
+
+        def sample():
+            while not done.is_set():
+                peak[0] = max(peak[0], _tree_rss(process))
+                done.wait(RSS_SAMPLE_SECONDS)
+
+        sampler = threading.Thread(target=sample, name='rss-sampler', daemon=True)
+        sampler.start()
+        try:
+            fn()
+        finally:
+            done.set()
+            sampler.join()
+        return max(peak[0], _tree_rss(process)) / (1024 * 1024)
+
+    fn()
+    if resource is None:
+        return float('nan')
+    kib = sum(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+    return kib / (1024 * 1024 if platform.system() == 'Darwin' else 1024)
+
+
+def _measure(fn, reset=None):
+    """
+    Runs fn twice with stdout silenced, calling reset() before each run so both start
+    cold: first untraced for the wall time, then for the peak RSS. Returns
+    (wall seconds, peak RSS MiB).
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        if reset is not None:
+            reset()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if reset is not None:
+            reset()
+        peak_mib = _peak_rss_mib(fn)
+    return elapsed, peak_mib
+
+
+def bench_fetch(tickers, scale, workdir):
+    """Cold fetches through a stub session into a fresh cache, then a fully cached re-read."""
+    n_reports = BASE_QUARTERLY_ROWS * scale
+    session = _StubSession(n_reports)
+    bucket = fetch_engine.TokenBucket(rate_per_minute=1e9)
+    cache = ResponseCache(cache_dir=os.path.join(workdir, f'cache_{scale}_{len(tickers)}'), offline=False)
+
+    def cold():
+        for ticker in tickers:
+            for statement in fetch_engine.AV_STATEMENTS:
+                payload = fetch_engine.fetch_statement(session, bucket, ticker, statement, 'benchmark')
+                cache.put('alpha_vantage', statement, ticker, payload)
+
+    def warm():
+        return fetch_engine.fetch_statements(tickers, 'benchmark', cache=cache)
+
+    n_rows = n_reports * len(tickers) * len(fetch_engine.AV_STATEMENTS)
+    return [('fetch_cold', n_rows, cold, None), ('fetch_cached', n_rows, warm, None)]
+
+
+def bench_prepare(inputs):
+    def run():
+        return [process_data(financial, stock, use_cache=False) for financial, stock in inputs]
+    n_rows = sum(len(financial) + len(stock) for financial, stock in inputs)
+    return [('prepare', n_rows, run, None)]
+
+
+def bench_forecasts(prepared, stages, registry_dir):
+    """Forecast stages; each run gets an empty model registry so no pass reuses another's models."""
+    runs = itertools.count()
+
+    def cold_registry():
+        model_registry._default_registry = model_registry.ModelRegistry(os.path.join(registry_dir, str(next(runs))))
+
+    benchmarks = []
+    n_rows = sum(len(df) for df in prepared)
+    if 'forecasting_engine' in stages:
+        benchmarks.append(('forecasting_engine', n_rows, lambda: [run_forecasting_model(df) for df in prepared],
+                           cold_registry))
+    if 'two_stage_forecast' in stages:
+        benchmarks.append(('two_stage_forecast', n_rows, lambda: [two_stage_forecast(df) for df in prepared],
+                           cold_registry))
+    return benchmarks
+
+
+def run_suite(scales=DEFAULT_SCALES, ticker_counts=DEFAULT_TICKERS, stages=STAGES):
+    """Runs the selected stages for every (scale, ticker count) and returns one record per stage."""
+    records = []
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='moat_bench_') as workdir:
+        # Forecasts write CSVs to the working directory and models to the registry; keep both
+        # out of the repo and start every run cold
+        os.chdir(workdir)
+        try:
+            for scale in scales:
+                for n_tickers in ticker_counts:
+                    tickers = synthetic_tickers(n_tickers)
+                    inputs = [
+                        (synthetic_kpi_data(BASE_QUARTERLY_ROWS * scale, seed=i),
+                         synthetic_stock_data(BASE_DAILY_ROWS * scale, seed=i))
+                        for i in range(n_tickers)
+                    ]
+                    benchmarks = []
+                    if 'fetch' in stages:
+                        benchmarks += bench_fetch(tickers, scale, workdir)
+                    if 'prepare' in stages:
+                        benchmarks += bench_prepare(inputs)
+                    if {'forecasting_engine', 'two_stage_forecast'} & set(stages):
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            prepared = [process_data(financial, stock, use_cache=False) for financial, stock in inputs]
+                        benchmarks += bench_forecasts(prepared, stages,
+                                                      os.path.join(workdir, f'models_{scale}_{n_tickers}'))
+
+                    for stage, n_rows, fn, reset in benchmarks:
+                        seconds, peak_mib = _measure(fn, reset)
+                        record = {
+                            'stage': stage,
+                            'scale': scale,
+                            'tickers': n_tickers,
+                            'rows': n_rows,
+                            'seconds': round(seconds, 4),
+                            'rows_per_second': round(n_rows / seconds, 1) if seconds else None,
+                            'peak_rss_mib': round(peak_mib, 2),
+                        }
+                        records.append(record)
+                        print(f"{stage:<20} scale={scale:<5} tickers={n_tickers:<4} rows={n_rows:<10} "
+                              f"{seconds:9.3f}s {record['rows_per_second'] or 0:14,.0f} rows/s {peak_mib:9.1f} MiB")
+        finally:
+            os.chdir(original_cwd)
+            model_registry._default_registry = None
+    return records
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def save_results(records, results_dir=RESULTS_DIR):
+    """Writes the run to results_dir/<timestamp>_<commit>.json and returns the path."""
+    revision = git_revision()
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"{timestamp}_{revision}.json")
+    with open(path, 'w') as f:
+        json.dump({
+            'commit': revision,
+            'timestamp': timestamp,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'results': records,
+        }, f, indent=2)
+    return path
+
+
+def compare_results(records, baseline_path):
+    """Prints the wall-time ratio of this run to a saved baseline run, per stage and size."""
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    previous = {(r['stage'], r['scale'], r['tickers']): r for r in baseline['results']}
+
+    print(f"\nCompared with {baseline['commit']} ({baseline['timestamp']}):")
+    for record in records:
+        before = previous.get((record['stage'], record['scale'], record['tickers']))
+        if before is None or not record['seconds']:
+            continue
+        print(f"{record['stage']:<20} scale={record['scale']:<5} tickers={record['tickers']:<4} "
+              f"{before['seconds']:9.3f}s -> {record['seconds']:9.3f}s  ({before['seconds'] / record['seconds']:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the NVIDIA moat pipeline.")
+    parser.add_argument('--scales', type=int, nargs='+', default=list(DEFAULT_SCALES),
+                        help="Row multipliers over the real file sizes (e.g. 1 10 100 1000).")
+    parser.add_argument('--tickers', type=int, nargs='+', default=list(DEFAULT_TICKERS),
+                        help="Ticker counts to benchmark.")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--compare', metavar='RESULTS_JSON', help="Saved run to compare against.")
+    parser.add_argument('--no-save', action='store_true', help="Do not write the results file.")
+    args = parser.parse_args()
+
+    records = run_suite(args.scales, args.tickers, args.stages)
+    if not args.no_save:
+        print(f"\nResults saved to '{save_results(records)}'")
+    if args.compare:
+        compare_results(records, args.compare)
+
+
+if __name__ == "__main__":
+    main()
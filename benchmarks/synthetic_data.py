@@ -0,0 +1,79 @@
+"""
+Synthetic data generators shaped like the pipeline's real inputs, for offline benchmarks.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Base sizes of the real files: ~6,700 daily bars and ~15 quarters of DAX KPIs per ticker
+BASE_DAILY_ROWS = 6700
+BASE_QUARTERLY_ROWS = 15
+STATEMENT_FIELDS = 30
+# Year/Quarter parsing needs real calendar quarters, so quarterly series are capped at
+# 300 years; daily series longer than the business days since 1900 use evenly spaced timestamps.
+MAX_QUARTERLY_ROWS = 1200
+DAILY_HISTORY_START = '1900-01-01'
+
+
+def synthetic_tickers(n_tickers):
+    """Returns n_tickers distinct fake ticker symbols."""
+    return [f"T{i:04d}" for i in range(n_tickers)]
+
+
+def synthetic_stock_data(n_rows=BASE_DAILY_ROWS, end_date='2025-09-05', seed=0):
+    """Daily bars shaped like nvda_stock_data.csv: geometric random-walk prices and lognormal volume."""
+    rng = np.random.default_rng(seed)
+    if n_rows <= len(pd.bdate_range(DAILY_HISTORY_START, end_date)):
+        dates = pd.bdate_range(end=end_date, periods=n_rows)
+    else:
+        dates = pd.date_range(DAILY_HISTORY_START, end_date, periods=n_rows)
+    # Longer histories get proportionally smaller steps so prices stay in a realistic range
+    step = min(1.0, BASE_DAILY_ROWS / n_rows)
+    log_returns = rng.normal(0.0008 * step, 0.03 * np.sqrt(step), size=n_rows)
+    prices = 0.04 * np.exp(np.cumsum(log_returns))
+    volume = rng.lognormal(mean=20, sigma=0.6, size=n_rows).astype(np.int64)
+    return pd.DataFrame({
+        'Report Date': dates,
+        'adjustedCloseStockPrice': prices,
+        'dailyTradingVolume': volume,
+    })
+
+
+def synthetic_kpi_data(n_rows=BASE_QUARTERLY_ROWS, end_year=2025, seed=0):
+    """Quarterly KPIs shaped like nvidia_financial_data_DAX.csv, with 'Qtr N' quarters and '%' strings."""
+    n_rows = min(n_rows, MAX_QUARTERLY_ROWS)
+    rng = np.random.default_rng(seed)
+    quarter_index = np.arange(end_year * 4 - n_rows, end_year * 4)
+    step = min(1.0, BASE_QUARTERLY_ROWS / n_rows)
+    revenue = 3e9 * np.exp(np.cumsum(rng.normal(0.05 * step, 0.1 * np.sqrt(step), size=n_rows)))
+    gross_margin = np.clip(rng.normal(0.65, 0.05, size=n_rows), 0.3, 0.9)
+    invested_capital = revenue * rng.uniform(3, 6, size=n_rows)
+    roic = rng.normal(0.1, 0.05, size=n_rows)
+
+    def _percent(values):
+        return [f"{v * 100:.2f}%" for v in values]
+
+    return pd.DataFrame({
+        'Year': quarter_index // 4,
+        'Quarter': [f"Qtr {q % 4 + 1}" for q in quarter_index],
+        'ROIC (%)': _percent(roic),
+        'Gross Margin %': _percent(gross_margin),
+        'R&D as % of Revenue': _percent(rng.uniform(0.08, 0.25, size=n_rows)),
+        'Free Cash Flow': (revenue * rng.normal(0.3, 0.1, size=n_rows)).astype(np.int64),
+        'Invested Capital': invested_capital.astype(np.int64),
+        'grossProfit': (revenue * gross_margin).astype(np.int64),
+        'Total Revenue': revenue.astype(np.int64),
+    })
+
+
+def synthetic_statement_payload(symbol, n_reports=BASE_QUARTERLY_ROWS * 6, seed=0):
+    """An Alpha Vantage statement JSON payload with string-encoded numbers, as the API returns it."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end='2025-07-31', periods=n_reports, freq=pd.offsets.QuarterEnd())
+    values = rng.integers(1_000_000, 50_000_000_000, size=(n_reports, STATEMENT_FIELDS))
+    reports = []
+    for date, row in zip(dates, values):
+        report = {'fiscalDateEnding': date.strftime('%Y-%m-%d'), 'reportedCurrency': 'USD'}
+        report.update({f'field{i}': str(v) for i, v in enumerate(row)})
+        reports.append(report)
+    return {'symbol': symbol, 'quarterlyReports': reports, 'annualReports': []}
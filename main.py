@@ -2,52 +2,277 @@
 """
 Main execution script for NVIDIA Moat Analysis
 Orchestrates the entire data pipeline and forecasting process
+
+    python main.py              # full pipeline, skipping stages whose inputs are unchanged
+    python main.py run --force  # full pipeline, rerunning every stage
+    python main.py collect      # fetch statements and stock prices
+    python main.py process      # build the merged quarterly feature frame
+    python main.py forecast     # forecast from local data only (no network)
+    python main.py export       # regenerate the Power BI CSVs
+    python main.py tune         # search hyperparameters for the forecasting models
+    python main.py universe --tickers NVDA AMD INTC   # process and forecast a peer universe
+    python main.py serve        # keep the models hot and answer forecast/what-if requests over HTTP
+    python main.py --resume     # continue a failed run, skipping the stages and tickers it completed
+
+Each subcommand imports only the modules it needs, so e.g. a forecast-only run
+never loads yfinance or requests.
 """
 
+import argparse
 import logging
-from src.data_pipeline.financial_data_collector import fetch_financial_data
-from src.data_pipeline.stock_data_collector import fetch_stock_data
-from src.data_pipeline.data_processor import process_data
-from src.machine_learning.forecasting_engine import run_forecasting
-from src.machine_learning.two_stage_forecast import two_stage_forecast
+import os
+import shutil
+from types import SimpleNamespace
+
+from src.utils.config import get_setting, resolve_path
+from src.utils.instrumentation import configure, count_rows, stage
+from src.utils.scheduler import PipelineDAG, Stage
+
+FORECAST_OUTPUTS = ('kpi_forecast.csv', 'price_forecast.csv', 'price_forecast_bands.csv')
+RAW_DIR = get_setting('paths', 'raw_data', default='data/raw')
+PROCESSED_DIR = get_setting('paths', 'processed_data', default='data/processed')
+FORECASTS_DIR = get_setting('paths', 'forecasts', default='data/forecasts')
+MODELS_DIR = get_setting('paths', 'models', default='data/models')
+
+logger = logging.getLogger(__name__)
+
+
+def run_collect(args=None):
+    """Step 1: Data Collection (financial statements and stock prices are fetched in parallel)"""
+    logger.info("Step 1: Collecting data...")
+    results = build_pipeline_dag().run(targets=['collect_financial', 'collect_stock'],
+                                       resume=getattr(args, 'resume', False))
+    # Stages completed by an interrupted run are not rerun on --resume and return nothing
+    return results.get('collect_financial'), results.get('collect_stock')
+
+
+def run_process(args=None, stock_data=None):
+    """Step 2: Data Processing"""
+    from src.data_pipeline.data_processor import process_data
+
+    logger.info("Step 2: Processing data...")
+    return process_data(stock_data=stock_data)
+
+
+def run_forecast(args=None, processed_data=None):
+    """Steps 3 and 4: Forecasting and Two-Stage Forecasting"""
+    models = getattr(args, 'models', 'all')
+    if processed_data is None:
+        processed_data = run_process(args)
+
+    forecast_results = two_stage_results = None
+    if models in ('all', 'engine'):
+        from src.machine_learning.forecasting_engine import run_forecasting_model
+
+        logger.info("Step 3: Running forecasts...")
+        with stage('forecasting_engine', rows_in=count_rows(processed_data)):
+            forecast_results = run_forecasting_model(processed_data)
+
+    if models in ('all', 'two-stage'):
+        from src.machine_learning.two_stage_forecast import two_stage_forecast
+
+        logger.info("Step 4: Running two-stage forecasting...")
+        with stage('two_stage_forecast', rows_in=count_rows(processed_data)):
+            two_stage_results = two_stage_forecast(processed_data)
+
+    return forecast_results, two_stage_results
+
+
+def run_tune(args=None, processed_data=None):
+    """Tunes the forecasting models on local data and saves the winners for later runs."""
+    from src.machine_learning import tuning
+
+    models = getattr(args, 'models', 'all')
+    if processed_data is None:
+        processed_data = run_process(args)
+
+    results = {}
+    with stage('tuning', rows_in=count_rows(processed_data)):
+        if models in ('all', 'engine'):
+            logger.info("Tuning the forecasting engine models...")
+            results.update(tuning.tune_forecasting_models(processed_data))
+        if models in ('all', 'two-stage'):
+            logger.info("Tuning the two-stage price model...")
+            results.update(tuning.tune_stage2_model(processed_data))
+    return results
+
+
+def run_export(args=None):
+    """
+    Regenerates the Power BI CSVs from the Parquet store, refreshes the monthly and
+    fiscal-quarter rollups and collects the forecast outputs.
+    """
+    from src.data_pipeline.data_processor import COMPANY_TICKER, STOCK_COLUMNS, STOCK_DATA_FILE
+    from src.data_pipeline.powerbi_export import POWERBI_DIR, export_rollups
+    from src.data_pipeline.storage import export_csv, partition_exists, read_prices
+
+    logger.info("Exporting Power BI tables...")
+    exported = []
+    with stage('export') as metrics:
+        # Peers collected by `main.py universe` share the dataset, so check the company's own partition
+        has_partition = partition_exists('stock_prices', COMPANY_TICKER)
+        if has_partition:
+            exported.append(export_csv('stock_prices', STOCK_DATA_FILE, tickers=[COMPANY_TICKER]))
+
+        if os.path.exists(STOCK_DATA_FILE) or has_partition:
+            stock_df = read_prices(COMPANY_TICKER, STOCK_DATA_FILE, columns=STOCK_COLUMNS).assign(ticker=COMPANY_TICKER)
+            written = export_rollups(stock_df)
+            logger.info(f"Rollups in {POWERBI_DIR}: rewrote {written} partitions")
+
+        # The forecasting scripts write their CSVs to the working directory
+        forecasts_dir = resolve_path(get_setting('paths', 'forecasts', default='data/forecasts'))
+        os.makedirs(forecasts_dir, exist_ok=True)
+        for file_name in FORECAST_OUTPUTS:
+            if os.path.exists(file_name):
+                exported.append(shutil.copy2(file_name, os.path.join(forecasts_dir, file_name)))
+        metrics.rows_out = len(exported)
+
+    for path in exported:
+        logger.info(f"Exported {path}")
+    return exported
 
-def main():
+
+def run_universe(args=None):
+    """
+    Processes and forecasts every ticker of a universe on a process pool and writes the
+    per-ticker results plus the combined peer comparison table.
+    """
+    from src.machine_learning import universe
+
+    tickers = universe.parse_tickers(getattr(args, 'tickers', None), getattr(args, 'tickers_file', None))
+    tickers = tickers or universe.default_universe()
+    if getattr(args, 'collect', False):
+        logger.info(f"Collecting data for {len(tickers)} tickers...")
+        universe.collect_universe(tickers, resume=getattr(args, 'resume', False))
+
+    logger.info(f"Forecasting a universe of {len(tickers)} tickers...")
+    workers = getattr(args, 'workers', None) or universe.UNIVERSE_MAX_WORKERS
+    return universe.run_universe(tickers, models=getattr(args, 'models', 'all'), max_workers=workers,
+                                 resume=getattr(args, 'resume', False))
+
+
+def run_serve(args=None):
+    """Serves forecasts and what-if KPI scenarios from in-memory models until interrupted."""
+    from src.machine_learning import forecast_service
+
+    logger.info("Starting the forecast service...")
+    forecast_service.serve(host=getattr(args, 'host', None) or forecast_service.SERVICE_HOST,
+                           port=getattr(args, 'port', None) or forecast_service.SERVICE_PORT)
+
+
+def _collect_financial():
+    from src.data_pipeline.financial_data_collector import fetch_financial_data
+
+    with stage('collect_financial') as metrics:
+        financial_data = fetch_financial_data()
+        metrics.rows_out = count_rows(financial_data)
+    return financial_data
+
+
+def _collect_stock():
+    from src.data_pipeline.stock_data_collector import COMPANY_TICKER, update_stock_data
+
+    with stage('collect_stock') as metrics:
+        stock_data = update_stock_data(COMPANY_TICKER)
+        metrics.rows_out = count_rows(stock_data)
+    return stock_data
+
+
+def build_pipeline_dag():
+    """
+    The pipeline as a DAG of stages and the artifacts they read and write. Collection
+    always runs (its response cache decides what is refetched); every other stage is
+    skipped when its input files, its code and config.yml are unchanged.
+    """
+    # The KPIs are computed from the raw statements, with the Power BI export as a fallback
+    financial_kpis = [os.path.join(RAW_DIR, 'nvidia_financial_data.csv'),
+                      os.path.join(PROCESSED_DIR, 'nvidia_financial_data_DAX.csv')]
+    stock_prices = os.path.join(PROCESSED_DIR, 'nvda_stock_data.csv')
+    tuned_params = os.path.join(MODELS_DIR, 'tuned_params.json')
+    # The forecasting scripts write their CSVs to the working directory
+    forecast_files = {name: os.path.abspath(name) for name in FORECAST_OUTPUTS}
+    # Each stage's code version also covers every src module these import (module_dependencies)
+    process_code = ['src.data_pipeline.data_processor']
+
+    return PipelineDAG([
+        Stage('collect_financial', _collect_financial, external=True,
+              outputs=[os.path.join(RAW_DIR, 'nvidia_financial_data.csv')]),
+        Stage('collect_stock', _collect_stock, external=True, outputs=[stock_prices]),
+        Stage('process', run_process, inputs=financial_kpis + [stock_prices], code=process_code),
+        # Both forecasts write price_forecast.csv; the two-stage model runs second and owns
+        # the file, so the engine declares no outputs and reruns only when its inputs change
+        Stage('forecasting_engine', lambda: run_forecast(SimpleNamespace(models='engine'))[0],
+              inputs=financial_kpis + [stock_prices, tuned_params],
+              code=process_code + ['src.machine_learning.forecasting_engine'],
+              after=['process']),
+        Stage('two_stage_forecast', lambda: run_forecast(SimpleNamespace(models='two-stage'))[1],
+              inputs=financial_kpis + [stock_prices, tuned_params], outputs=list(forecast_files.values()),
+              code=process_code + ['src.machine_learning.two_stage_forecast'],
+              after=['process', 'forecasting_engine']),
+        Stage('export', run_export, inputs=list(forecast_files.values()) + [stock_prices],
+              code=['src.data_pipeline.powerbi_export'],
+              outputs=[os.path.join(FORECASTS_DIR, name) for name in FORECAST_OUTPUTS]),
+    ])
+
+
+def run_pipeline(args=None):
+    """Runs the pipeline DAG, skipping stages whose inputs and code are unchanged."""
+    logger.info("Starting NVIDIA Moat Analysis Pipeline")
+    results = build_pipeline_dag().run(targets=getattr(args, 'stages', None), force=getattr(args, 'force', False),
+                                       resume=getattr(args, 'resume', False))
+    logger.info(f"Pipeline completed successfully! Ran: {', '.join(results) or 'nothing (everything up to date)'}")
+    return results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="NVIDIA Moat Analysis pipeline.")
+    parser.add_argument('--metrics', action='store_true', help="Record per-stage metrics (see config.yml instrumentation).")
+    parser.add_argument('--profile', action='store_true', help="Also write a cProfile dump per stage.")
+    parser.add_argument('--resume', action='store_true',
+                        help="Skip the stages and tickers a failed run completed (verified by checksum).")
+    subparsers = parser.add_subparsers(dest='command')
+
+    run = subparsers.add_parser('run', help="Run the pipeline DAG, skipping up-to-date stages (the default).")
+    run.add_argument('--force', action='store_true', help="Rerun every stage.")
+    run.add_argument('--stages', nargs='+', help="Run only these stages and the stages they depend on.")
+    run.set_defaults(handler=run_pipeline)
+    subparsers.add_parser('collect', help="Fetch financial statements and daily stock prices.").set_defaults(handler=run_collect)
+    subparsers.add_parser('process', help="Build the merged quarterly feature frame.").set_defaults(handler=run_process)
+    forecast = subparsers.add_parser('forecast', help="Run the forecasts on local data.")
+    forecast.add_argument('--models', choices=('all', 'engine', 'two-stage'), default='all')
+    forecast.set_defaults(handler=run_forecast)
+    subparsers.add_parser('export', help="Regenerate the Power BI CSV exports.").set_defaults(handler=run_export)
+    tune = subparsers.add_parser('tune', help="Tune the forecasting models' hyperparameters on local data.")
+    tune.add_argument('--models', choices=('all', 'engine', 'two-stage'), default='all')
+    tune.set_defaults(handler=run_tune)
+    peers = subparsers.add_parser('universe', help="Process and forecast a ticker universe in parallel.")
+    peers.add_argument('--tickers', nargs='+', help="Tickers to run (default: universe in config.yml).")
+    peers.add_argument('--tickers-file', help="File of tickers (comma/whitespace separated, or a CSV with 'ticker').")
+    peers.add_argument('--collect', action='store_true', help="Fetch statements and prices for the tickers first.")
+    peers.add_argument('--workers', type=int, help="Worker processes (default: universe.max_workers or all cores).")
+    peers.add_argument('--models', choices=('all', 'engine', 'two-stage'), default='all')
+    peers.set_defaults(handler=run_universe)
+    serve = subparsers.add_parser('serve', help="Serve forecasts and what-if scenarios over local HTTP.")
+    serve.add_argument('--host', help="Interface to bind (default: service.host in config.yml).")
+    serve.add_argument('--port', type=int, help="Port to listen on (default: service.port in config.yml).")
+    serve.set_defaults(handler=run_serve)
+    return parser
+
+
+def main(argv=None):
     """Main execution function"""
     logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-    
+    args = build_parser().parse_args(argv)
+    if args.metrics or args.profile:
+        configure(enabled=True, profile=args.profile or None)
+
     try:
-        logger.info("Starting NVIDIA Moat Analysis Pipeline")
-        
-        # Step 1: Data Collection
-        logger.info("Step 1: Collecting data...")
-        financial_data = fetch_financial_data()
-        stock_data = fetch_stock_data()
-        
-        # Step 2: Data Processing
-        logger.info("Step 2: Processing data...")
-        processed_data = process_data(financial_data, stock_data)
-        
-        # Step 3: Forecasting
-        logger.info("Step 3: Running forecasts...")
-        forecast_results = run_forecasting(processed_data)
-        
-        # Step 4: Two-Stage Forecasting
-        logger.info("Step 4: Running two-stage forecasting...")
-        two_stage_results = two_stage_forecast()
-        
-        logger.info("Pipeline completed successfully!")
-        
-        return {
-            'financial_data': financial_data,
-            'stock_data': stock_data,
-            'forecast_results': forecast_results,
-            'two_stage_results': two_stage_results
-        }
-        
+        handler = getattr(args, 'handler', run_pipeline)
+        return handler(args)
+
     except Exception as e:
         logger.error(f"Pipeline failed: {e}")
         raise
 
 if __name__ == "__main__":
-    results = main()
\ No newline at end of file
+    results = main()
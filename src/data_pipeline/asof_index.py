@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.storage import DATE_COLUMN
+
+# Composite lookup keys are (ticker code << TICKER_SHIFT) | seconds since KEY_EPOCH, so
+# one sorted int64 array covers every ticker: ~35,000 years of seconds and 8M tickers.
+TICKER_SHIFT = 40
+KEY_EPOCH = np.datetime64('1800-01-01T00:00:00', 's')
+DIRECTIONS = ('backward', 'forward', 'nearest')
+
+
+def _seconds(dates):
+    return (pd.to_datetime(np.asarray(dates)).to_numpy(dtype='datetime64[s]') - KEY_EPOCH).astype(np.int64)
+
+
+class AsofIndex:
+    """
+    Sorted date index over daily bars of one or many tickers.
+    The bars are sorted once; afterwards nearest/backward/forward lookups for any batch
+    of (ticker, date) pairs are a single searchsorted over composite keys, and windowed
+    sums, means and standard deviations around each date come from prefix sums.
+    """
+
+    def __init__(self, df, ticker_column='ticker', date_column=DATE_COLUMN):
+        self.ticker_column = ticker_column
+        self.date_column = date_column
+        self._build(df)
+
+    def _build(self, df):
+        self.by_ticker = self.ticker_column in df.columns
+        tickers = df[self.ticker_column] if self.by_ticker else pd.Series('', index=df.index)
+        codes, self.tickers = pd.factorize(tickers.astype(str), sort=True)
+        seconds = _seconds(df[self.date_column])
+        keys = (codes.astype(np.int64) << TICKER_SHIFT) | seconds
+
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.seconds = seconds[order]
+        self.codes = codes[order]
+        self.frame = df.iloc[order].reset_index(drop=True)
+        self._prefix = {}
+
+    def extend(self, new_rows):
+        """Adds bars (e.g. newly downloaded days) and re-sorts; rows already sorted stay cheap to sort."""
+        self._build(pd.concat([self.frame, new_rows], ignore_index=True))
+        return self
+
+    def _codes_for(self, tickers, n):
+        if tickers is None or not self.by_ticker:
+            if len(self.tickers) > 1:
+                raise ValueError("Lookups against several tickers need a ticker for every date")
+            return np.zeros(n, dtype=np.int64)
+        codes = self.tickers.get_indexer(pd.Index(np.asarray(tickers).astype(str)))
+        return codes.astype(np.int64)
+
+    def lookup(self, dates, tickers=None, direction='nearest', tolerance=None):
+        """
+        Returns the row position of the matching bar for every (ticker, date) pair, or -1
+        when there is none (unknown ticker, no bar in that direction, or beyond
+        `tolerance`). 'nearest' breaks ties towards the earlier bar, like merge_asof.
+        """
+        if direction not in DIRECTIONS:
+            raise ValueError(f"direction must be one of {DIRECTIONS}")
+        seconds = _seconds(dates)
+        if len(self.keys) == 0:
+            return np.full(len(seconds), -1, dtype=np.int64)
+        codes = self._codes_for(tickers, len(seconds))
+        known = codes >= 0
+        query = (np.where(known, codes, 0) << TICKER_SHIFT) | seconds
+
+        # Last bar at or before the date, and first bar at or after it, within the same ticker
+        right = np.searchsorted(self.keys, query, side='right') - 1
+        left = np.searchsorted(self.keys, query, side='left')
+        n = len(self.keys)
+        backward = np.where((right >= 0) & (self.codes[np.clip(right, 0, n - 1)] == codes), right, -1)
+        forward = np.where((left < n) & (self.codes[np.clip(left, 0, n - 1)] == codes), left, -1)
+
+        if direction == 'backward':
+            positions = backward
+        elif direction == 'forward':
+            positions = forward
+        else:
+            back_gap = np.where(backward >= 0, seconds - self.seconds[np.clip(backward, 0, n - 1)], np.iinfo(np.int64).max)
+            fwd_gap = np.where(forward >= 0, self.seconds[np.clip(forward, 0, n - 1)] - seconds, np.iinfo(np.int64).max)
+            positions = np.where(fwd_gap < back_gap, forward, backward)
+
+        if tolerance is not None:
+            gap = np.abs(self.seconds[np.clip(positions, 0, n - 1)] - seconds)
+            positions = np.where(gap <= pd.Timedelta(tolerance).total_seconds(), positions, -1)
+        return np.where(known, positions, -1)
+
+    def take(self, positions, columns):
+        """Values of `columns` at the given positions, with NaN where the position is -1."""
+        found = positions >= 0
+        if not found.any():
+            return pd.DataFrame(np.nan, index=pd.RangeIndex(len(positions)), columns=list(columns))
+        taken = self.frame.iloc[np.where(found, positions, 0)][columns].reset_index(drop=True)
+        return taken.where(pd.Series(found), other=np.nan) if not found.all() else taken
+
+    def join(self, left_df, columns, direction='nearest', tolerance=None, suffix='_stock'):
+        """
+        As-of joins `columns` of the indexed bars onto left_df by its date (and ticker,
+        when the indexed bars have one). Equivalent to pd.merge_asof, but left_df keeps its
+        row order and every ticker is matched in the same call.
+        """
+        tickers = left_df[self.ticker_column] if self.by_ticker and self.ticker_column in left_df.columns else None
+        positions = self.lookup(left_df[self.date_column], tickers, direction, tolerance)
+        values = self.take(positions, columns)
+        values.index = left_df.index
+        values.columns = [f"{col}{suffix}" if col in left_df.columns else col for col in columns]
+        return pd.concat([left_df, values], axis=1)
+
+    def _prefix_sums(self, column):
+        if column not in self._prefix:
+            values = pd.to_numeric(self.frame[column], errors='coerce').to_numpy(dtype=np.float64)
+            valid = np.isfinite(values)
+            filled = np.where(valid, values, 0.0)
+            self._prefix[column] = tuple(np.concatenate([[0.0], np.cumsum(a)])
+                                         for a in (filled, filled ** 2, valid.astype(np.float64)))
+        return self._prefix[column]
+
+    def window(self, dates, column, tickers=None, before='0D', after='0D'):
+        """
+        Aggregates `column` over the bars of each ticker within [date - before, date + after].
+        Returns a frame with the count, sum, mean and standard deviation of every window.
+        """
+        seconds = _seconds(dates)
+        codes = self._codes_for(tickers, len(seconds))
+        known = codes >= 0
+        base = np.where(known, codes, 0) << TICKER_SHIFT
+        lo = np.searchsorted(self.keys, base | (seconds - int(pd.Timedelta(before).total_seconds())), side='left')
+        hi = np.searchsorted(self.keys, base | (seconds + int(pd.Timedelta(after).total_seconds())), side='right')
+        hi = np.where(known, hi, lo)
+
+        total, squares, counts = (prefix[hi] - prefix[lo] for prefix in self._prefix_sums(column))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / counts
+            variance = (squares - counts * mean ** 2) / (counts - 1)
+        return pd.DataFrame({
+            'count': counts.astype(np.int64),
+            'sum': total,
+            'mean': mean,
+            'std': np.sqrt(np.clip(variance, 0, None)),
+        })
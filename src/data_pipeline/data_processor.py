@@ -0,0 +1,175 @@
+import functools
+import hashlib
+import os
+import pickle
+import tempfile
+
+import pandas as pd
+import numpy as np
+
+from src.data_pipeline.asof_index import AsofIndex
+from src.data_pipeline.market_features import (FEATURE_WINDOWS, MARKET_FEATURE_COLUMNS, compute_market_features,
+                                               load_market_features)
+from src.data_pipeline.moat_metrics import RAW_FINANCIAL_FILE, load_moat_kpis
+from src.data_pipeline.storage import price_source, read_prices
+from src.utils.checkpoint import hash_path
+from src.utils.config import get_setting, resolve_path
+from src.utils.instrumentation import count, instrumented
+
+# --- Configuration ---
+COMPANY_TICKER = get_setting('company', 'ticker', default='NVDA')
+PROCESSED_DIR = resolve_path(get_setting('paths', 'processed_data', default='data/processed'))
+FINANCIAL_KPI_FILE = os.path.join(PROCESSED_DIR, 'nvidia_financial_data_DAX.csv')
+STOCK_DATA_FILE = os.path.join(PROCESSED_DIR, 'nvda_stock_data.csv')
+# 'raw' computes the moat KPIs from the raw statements; 'dax' reads the Power BI export
+KPI_SOURCE = get_setting('data_sources', 'kpi_source', default='raw')
+KPI_HISTORY_START = get_setting('data_sources', 'kpi_history_start', default=None)
+PROCESSED_CACHE_DIR = os.path.join(resolve_path(get_setting('cache', 'dir', default='data/cache')), 'processed')
+
+PERCENTAGE_KPIS = ['ROIC (%)', 'Gross Margin %', 'R&D as % of Revenue']
+KPI_COLUMNS = PERCENTAGE_KPIS + ['Free Cash Flow']
+STOCK_COLUMNS = ['Report Date', 'adjustedCloseStockPrice', 'dailyTradingVolume']
+
+# Bump whenever the processing logic changes so memoized frames are rebuilt
+PROCESSOR_VERSION = 4
+
+# --- 1. Parsing Helpers ---
+
+def parse_report_dates(financial_df):
+    """
+    Builds 'Report Date' from the 'Year' and 'Quarter' ("Qtr N") columns.
+    Quarters map to calendar quarter ends (03-31, 06-30, 09-30, 12-31); rows without a
+    valid Year/Quarter are dropped and the frame is returned sorted by date.
+    """
+    if 'Year' not in financial_df.columns or 'Quarter' not in financial_df.columns:
+        raise KeyError("Missing 'Year' or 'Quarter' column in financial data.")
+
+    financial_df = financial_df.copy()
+    year = pd.to_numeric(financial_df['Year'], errors='coerce')
+    quarter = pd.to_numeric(financial_df['Quarter'].astype(str).str.replace('Qtr ', '', regex=False), errors='coerce')
+    valid = year.notna() & quarter.between(1, 4)
+
+    financial_df = financial_df[valid].copy()
+    financial_df['Year'] = year[valid].astype(int)
+    financial_df['Quarter'] = quarter[valid].astype(int)
+    financial_df['Report Date'] = pd.to_datetime(
+        pd.DataFrame({'year': financial_df['Year'], 'month': financial_df['Quarter'] * 3, 'day': 1})
+    ) + pd.offsets.MonthEnd(0)
+
+    return financial_df.sort_values('Report Date', kind='stable').reset_index(drop=True)
+
+
+def clean_kpi_columns(financial_df, kpis=KPI_COLUMNS):
+    """Strips '%' from the pre-calculated KPI columns and converts them to numbers."""
+    for kpi in kpis:
+        if kpi not in financial_df.columns:
+            continue
+        values = financial_df[kpi]
+        if not pd.api.types.is_numeric_dtype(values):
+            values = values.astype(str).str.rstrip('%').replace('', np.nan)
+        financial_df[kpi] = pd.to_numeric(values, errors='coerce')
+    return financial_df
+
+
+def load_financial_kpis(path=FINANCIAL_KPI_FILE):
+    """Loads the DAX KPI export, dropping duplicated header columns (e.g. a second 'ROIC (%)')."""
+    financial_df = pd.read_csv(path, encoding='utf-8-sig')
+    financial_df.columns = financial_df.columns.str.strip()
+    return financial_df.loc[:, ~financial_df.columns.str.fullmatch(r'.+\.\d+')]
+
+
+def merge_with_prices(financial_df, stock_df):
+    """
+    Aligns each quarterly row with the closest daily stock bar (of the same ticker when
+    both frames carry one). The bars are indexed once and all rows are looked up together.
+    """
+    columns = [col for col in STOCK_COLUMNS if col != 'Report Date' and col in stock_df.columns]
+    index = AsofIndex(stock_df[[col for col in stock_df.columns if col in STOCK_COLUMNS + ['ticker']]])
+    return index.join(financial_df, columns, direction='nearest')
+
+# --- 2. Memoization ---
+
+def _hash_frame(df):
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=True).values.tobytes()
+                          + ','.join(map(str, df.columns)).encode('utf-8')).hexdigest()
+
+
+def fingerprint_inputs(*inputs, settings=()):
+    """
+    Fingerprints DataFrames, files or store partitions together with the processor
+    version and the settings that shape the output (KPI source, history start, ...).
+    """
+    digest = hashlib.sha256(f"v{PROCESSOR_VERSION};{settings!r}".encode('utf-8'))
+    for item in inputs:
+        digest.update(str(_hash_frame(item) if isinstance(item, pd.DataFrame) else hash_path(item)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _load_memoized(fingerprint):
+    path = os.path.join(PROCESSED_CACHE_DIR, f"{fingerprint}.pkl")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def _store_memoized(fingerprint, df):
+    os.makedirs(PROCESSED_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=PROCESSED_CACHE_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, os.path.join(PROCESSED_CACHE_DIR, f"{fingerprint}.pkl"))
+
+# --- 3. Processing Stage ---
+
+@instrumented('process_data')
+def process_data(financial_data=None, stock_data=None, financial_path=FINANCIAL_KPI_FILE,
+                 stock_path=STOCK_DATA_FILE, use_cache=True, statements_path=RAW_FINANCIAL_FILE):
+    """
+    Produces the merged, typed quarterly feature frame shared by both forecasting models:
+    'Report Date' parsed from Year/Quarter, numeric KPI columns, the nearest daily
+    stock price and volume and the rolling market features as of each report date.
+    DataFrames may be passed in directly; otherwise the KPIs are computed from the raw
+    statements (or, with kpi_source 'dax' or no raw file, read from the Power BI
+    export) and the stock data is read from the processed data folder.
+    The result is memoized on disk under a fingerprint of the inputs.
+    """
+    if KPI_SOURCE == 'raw' and os.path.exists(statements_path):
+        financial_path, load_kpis = statements_path, functools.partial(load_moat_kpis, start=KPI_HISTORY_START)
+    else:
+        load_kpis = load_financial_kpis
+    financial_input = financial_data if financial_data is not None else financial_path
+    # Without stock_data the bars come from the ticker's store partition, or the CSV until it exists
+    stock_input = stock_data if stock_data is not None else price_source(COMPANY_TICKER, stock_path)
+    settings = (KPI_SOURCE, KPI_HISTORY_START, sorted(FEATURE_WINDOWS.items()))
+    fingerprint = fingerprint_inputs(financial_input, stock_input, settings=settings) if use_cache else None
+
+    if use_cache:
+        cached = _load_memoized(fingerprint)
+        if cached is not None:
+            count('processed_cache_hits')
+            print("Loaded processed data from cache.")
+            return cached
+
+    print("Processing financial and stock data...")
+    financial_df = load_kpis(financial_path) if financial_data is None else financial_data.copy()
+    financial_df = clean_kpi_columns(parse_report_dates(financial_df))
+
+    if financial_df.empty:
+        raise ValueError("The financial data is empty after parsing 'Year' and 'Quarter'.")
+
+    if stock_data is None:
+        stock_data = read_prices(COMPANY_TICKER, stock_path, columns=STOCK_COLUMNS)
+        market_df = load_market_features(stock_data, COMPANY_TICKER)
+    else:
+        market_df = compute_market_features(stock_data)
+    combined_df = merge_with_prices(financial_df, stock_data)
+    # Market features as of the last trading day on or before each report date
+    combined_df = AsofIndex(market_df).join(combined_df, MARKET_FEATURE_COLUMNS, direction='backward')
+
+    if use_cache:
+        _store_memoized(fingerprint, combined_df)
+    return combined_df
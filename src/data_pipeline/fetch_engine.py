@@ -0,0 +1,179 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.data_pipeline.response_cache import CacheMissError, get_cache
+from src.utils.config import get_setting
+from src.utils.instrumentation import count, propagate, stage
+
+# --- Configuration ---
+AV_BASE_URL = get_setting('data_sources', 'alpha_vantage', 'base_url', default='https://www.alphavantage.co/query')
+AV_REQUESTS_PER_MINUTE = get_setting('data_sources', 'alpha_vantage', 'requests_per_minute', default=5)
+AV_MAX_WORKERS = get_setting('data_sources', 'alpha_vantage', 'max_workers', default=4)
+AV_MAX_RETRIES = get_setting('data_sources', 'alpha_vantage', 'max_retries', default=4)
+AV_STATEMENTS = ('INCOME_STATEMENT', 'BALANCE_SHEET', 'CASH_FLOW')
+
+# Alpha Vantage answers throttled calls with HTTP 200 and one of these keys instead of data
+AV_THROTTLE_KEYS = ('Note', 'Information')
+# Every statement payload carries these; anything else (e.g. {"Error Message": ...}) is a failure
+AV_REPORT_KEYS = ('quarterlyReports', 'annualReports')
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 60.0
+
+
+class ThrottledError(Exception):
+    """Raised when a request is still throttled after all retries."""
+
+
+def has_reports(payload):
+    """True if an Alpha Vantage payload holds statement reports rather than an error message."""
+    return isinstance(payload, dict) and any(key in payload for key in AV_REPORT_KEYS)
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every worker of a fetch run."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """Blocks until a token is available, then consumes it."""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def try_acquire(self):
+        """Consumes a token if one is available without blocking; returns whether it did."""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def drain(self):
+        """Empties the bucket so every worker backs off after a throttling response."""
+        with self.lock:
+            self._refill()
+            self.tokens = 0.0
+
+
+def build_session(pool_size=AV_MAX_WORKERS):
+    """Creates a requests session with a keep-alive connection pool sized for the workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def _backoff(attempt):
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))
+    return delay + random.uniform(0, delay / 2)
+
+
+def fetch_statement(session, bucket, symbol, function, api_key, base_url=AV_BASE_URL, max_retries=AV_MAX_RETRIES):
+    """Fetches one Alpha Vantage statement, retrying with backoff on throttling responses."""
+    params = {'function': function, 'symbol': symbol, 'apikey': api_key}
+
+    for attempt in range(max_retries + 1):
+        bucket.acquire()
+        count('api_requests')
+        try:
+            response = session.get(base_url, params=params, timeout=30)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if attempt == max_retries:
+                raise
+            print(f"Connection problem for {symbol} {function} ({e}), retrying...")
+            time.sleep(_backoff(attempt))
+            continue
+
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            throttled = f"HTTP {response.status_code}"
+        else:
+            response.raise_for_status()
+            data = response.json()
+            throttled = next((data[k] for k in AV_THROTTLE_KEYS if k in data and len(data) == 1), None)
+            if throttled is None:
+                if not has_reports(data):
+                    message = data.get('Error Message', data) if isinstance(data, dict) else data
+                    raise ValueError(f"{symbol} {function} returned no reports: {message}")
+                return data
+
+        count('api_throttled')
+        if attempt == max_retries:
+            raise ThrottledError(f"{symbol} {function} still throttled after {max_retries} retries: {throttled}")
+        bucket.drain()
+        time.sleep(_backoff(attempt))
+
+
+def fetch_statements(tickers, api_key, statements=AV_STATEMENTS, base_url=AV_BASE_URL,
+                     requests_per_minute=AV_REQUESTS_PER_MINUTE, max_workers=AV_MAX_WORKERS, cache=None):
+    """
+    Fetches every (ticker, statement) pair concurrently under one shared rate limit.
+    Cached payloads are served without touching the network or the rate limit; only
+    payloads with statement reports are cached, so error answers are retried next run.
+    Returns a dict mapping (ticker, statement) to the raw JSON payload, or None on failure.
+    """
+    cache = cache or get_cache()
+    results = {}
+    jobs = []
+    for ticker in tickers:
+        for statement in statements:
+            try:
+                payload = cache.get('alpha_vantage', statement, ticker)
+            except CacheMissError as e:
+                print(f"Warning: {e}")
+                results[(ticker, statement)] = None
+                continue
+            if has_reports(payload):
+                results[(ticker, statement)] = payload
+            elif payload is not None and cache.offline:
+                print(f"Warning: cached Alpha Vantage {statement} response for {ticker} holds no reports")
+                results[(ticker, statement)] = None
+            else:
+                jobs.append((ticker, statement))
+
+    if not jobs:
+        return results
+
+    bucket = TokenBucket(requests_per_minute)
+
+    with stage('fetch_statements', rows_in=len(jobs)) as metrics, build_session(max_workers) as session, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(propagate(fetch_statement), session, bucket, ticker, statement, api_key, base_url):
+                (ticker, statement)
+            for ticker, statement in jobs
+        }
+        for future in as_completed(futures):
+            ticker, statement = futures[future]
+            try:
+                payload = future.result()
+                results[(ticker, statement)] = payload
+                cache.put('alpha_vantage', statement, ticker, payload)
+            except (requests.exceptions.RequestException, ThrottledError, ValueError) as e:
+                print(f"Request failed for Alpha Vantage {statement} ({ticker}): {e}")
+                results[(ticker, statement)] = None
+        metrics.rows_out = sum(payload is not None for payload in results.values())
+
+    return results
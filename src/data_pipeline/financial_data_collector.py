@@ -1,14 +1,17 @@
+import os
+
 import pandas as pd
 import requests
-import json
-import numpy as np
-from datetime import datetime
-import yfinance as yf
+
+from src.data_pipeline.fetch_engine import AV_STATEMENTS, fetch_statements
+from src.data_pipeline.response_cache import CacheMissError, get_cache
+from src.data_pipeline.statement_schema import STATEMENT_SCHEMA, apply_schema
+from src.utils.config import get_setting, resolve_path
 
 # --- Configuration ---
-API_KEY = 'Your Alpha Vantage API key'
-COMPANY_TICKER = 'NVDA'
-OUTPUT_CSV_FILE = 'nvidia_financial_data.csv'
+API_KEY = os.environ.get('ALPHA_VANTAGE_API_KEY', 'Your Alpha Vantage API key')
+COMPANY_TICKER = get_setting('company', 'ticker', default='NVDA')
+OUTPUT_CSV_FILE = os.path.join(resolve_path(get_setting('paths', 'raw_data', default='data/raw')), 'nvidia_financial_data.csv')
 
 # Alpha Vantage API endpoints
 AV_INCOME_STATEMENT_URL = 'https://www.alphavantage.co/query?function=INCOME_STATEMENT&symbol={}&apikey={}'
@@ -17,43 +20,74 @@ AV_CASH_FLOW_URL = 'https://www.alphavantage.co/query?function=CASH_FLOW&symbol=
 
 # --- 1. Define Data Fetching Functions ---
 
-def fetch_alpha_vantage_data(url, key, data_key):
-    """Fetches data from Alpha Vantage and returns it as a DataFrame."""
-    try:
-        response = requests.get(url.format(COMPANY_TICKER, key))
-        response.raise_for_status()
-        data = response.json()
-
-        if "Error Message" in data or data_key not in data or not data[data_key]:
-            print(f"Warning: No data found for {data_key} from Alpha Vantage.")
-            return pd.DataFrame()
+def parse_alpha_vantage_payload(data, data_key):
+    """Converts an Alpha Vantage statement payload into a DataFrame indexed by ReportDate."""
+    if not data or "Error Message" in data or data_key not in data or not data[data_key]:
+        print(f"Warning: No data found for {data_key} from Alpha Vantage.")
+        return pd.DataFrame()
 
-        df = pd.DataFrame(data[data_key])
+    # Only the schema columns are materialized; the numbers are parsed in one vectorized pass
+    reports = data[data_key]
+    schema_columns = [col for col in STATEMENT_SCHEMA if col in set().union(*reports)]
+    df = pd.DataFrame.from_records(reports, columns=['fiscalDateEnding'] + schema_columns)
+    df = pd.concat([df[['fiscalDateEnding']], apply_schema(df[schema_columns])], axis=1)
 
-        for col in df.columns:
-            if col != 'fiscalDateEnding':
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+    df.rename(columns={'fiscalDateEnding': 'ReportDate'}, inplace=True)
+    df['ReportDate'] = pd.to_datetime(df['ReportDate'])
+    df.set_index('ReportDate', inplace=True)
+    df['PeriodType'] = pd.Categorical(['Quarterly'] * len(df))
+    df = df[~df.index.duplicated(keep='first')]
 
-        df.rename(columns={'fiscalDateEnding': 'ReportDate'}, inplace=True)
-        df['ReportDate'] = pd.to_datetime(df['ReportDate'])
-        df.set_index('ReportDate', inplace=True)
-        df['PeriodType'] = 'Quarterly'
-        df = df[~df.index.duplicated(keep='first')]
+    return df
 
-        return df
+def fetch_alpha_vantage_data(url, key, data_key, symbol=COMPANY_TICKER):
+    """Fetches data from Alpha Vantage and returns it as a DataFrame."""
+    try:
+        response = requests.get(url.format(symbol, key))
+        response.raise_for_status()
+        return parse_alpha_vantage_payload(response.json(), data_key)
 
     except requests.exceptions.RequestException as e:
         print(f"Request failed for Alpha Vantage: {e}")
         return pd.DataFrame()
 
-def fetch_yfinance_data():
-    """Fetches annual data from yfinance as a fallback."""
-    print("Falling back to yfinance for annual data.")
-    nvidia = yf.Ticker(COMPANY_TICKER)
+def fetch_alpha_vantage_statements(tickers, key, data_key='quarterlyReports'):
+    """
+    Fetches income statement, balance sheet and cash flow for many tickers concurrently.
+    Returns a dict mapping each ticker to its (income, balance, cash flow) DataFrames.
+    """
+    payloads = fetch_statements(tickers, key, statements=AV_STATEMENTS)
+    return {
+        ticker: tuple(parse_alpha_vantage_payload(payloads.get((ticker, statement)), data_key)
+                      for statement in AV_STATEMENTS)
+        for ticker in tickers
+    }
+
+def combine_alpha_vantage_statements(income_statement, balance_sheet, cash_flow):
+    """Merges the three quarterly statements into one frame indexed by ReportDate."""
+    # Columns the statements share (currency, period type) are kept once, from the income statement
+    df_combined = income_statement.merge(balance_sheet, on='ReportDate', how='outer', suffixes=('', '_bs')).merge(
+        cash_flow, on='ReportDate', how='outer', suffixes=('', '_cf'))
+    df_combined = df_combined.loc[:, ~df_combined.columns.str.endswith(('_bs', '_cf'))]
+    # Keep only the last 100 entries for consistency
+    return df_combined.sort_index().tail(100)
+
+def fetch_yfinance_data(symbol=COMPANY_TICKER):
+    """Fetches a symbol's annual data from yfinance as a fallback."""
+    # yfinance is only needed on this fallback path, so it is not imported with the module
+    import yfinance as yf
+
+    print(f"Falling back to yfinance for annual data for {symbol}.")
+    ticker = yf.Ticker(symbol)
+    cache = get_cache()
 
-    annual_financials = nvidia.financials.T
-    annual_balance_sheet = nvidia.balance_sheet.T
-    annual_cashflow = nvidia.cashflow.T
+    try:
+        annual_financials = cache.fetch('yfinance_statements', 'financials', symbol, lambda: ticker.financials).T
+        annual_balance_sheet = cache.fetch('yfinance_statements', 'balance_sheet', symbol, lambda: ticker.balance_sheet).T
+        annual_cashflow = cache.fetch('yfinance_statements', 'cashflow', symbol, lambda: ticker.cashflow).T
+    except CacheMissError as e:
+        print(f"Warning: {e}")
+        return pd.DataFrame()
 
     dataframes = [annual_financials, annual_balance_sheet, annual_cashflow]
 
@@ -70,8 +104,9 @@ def fetch_yfinance_data():
             if df_combined.empty:
                 df_combined = df
             else:
-                df_combined = df_combined.merge(df, on='ReportDate', how='outer', suffixes=('', '_y'))
-                df_combined = df_combined.loc[:, ~df_combined.columns.duplicated()]
+                # Columns every statement carries (PeriodType) are kept once, from the first
+                df = df.drop(columns=[col for col in df.columns if col in df_combined.columns])
+                df_combined = df_combined.merge(df, on='ReportDate', how='outer')
 
     # Clean up column names for consistency
     if not df_combined.empty:
@@ -88,48 +123,52 @@ def fetch_yfinance_data():
             'Capital Expenditure': 'capitalExpenditures',
             'Free Cash Flow': 'freeCashFlow'
         }, inplace=True)
+        df_combined = apply_schema(df_combined)
 
     return df_combined
 
 # --- 2. Main Logic: Try Alpha Vantage, then fallback to yfinance ---
 
-print(f"Attempting to fetch quarterly data for {COMPANY_TICKER} from Alpha Vantage...")
-income_statement = fetch_alpha_vantage_data(AV_INCOME_STATEMENT_URL, API_KEY, 'quarterlyReports')
-balance_sheet = fetch_alpha_vantage_data(AV_BALANCE_SHEET_URL, API_KEY, 'quarterlyReports')
-cash_flow = fetch_alpha_vantage_data(AV_CASH_FLOW_URL, API_KEY, 'quarterlyReports')
-
-if not income_statement.empty and not balance_sheet.empty and not cash_flow.empty:
-    print("Alpha Vantage data fetched successfully.")
-    df_combined = income_statement.merge(balance_sheet, on='ReportDate', how='outer').merge(
-        cash_flow, on='ReportDate', how='outer', suffixes=('_bs', '_cf'))
-    df_combined.rename(columns={'PeriodType_cf': 'PeriodType'}, inplace=True)
-    df_combined = df_combined.loc[:, ~df_combined.columns.str.endswith(('_bs', '_cf'))]
-    # Keep only the last 100 entries for consistency
-    df_combined = df_combined.sort_index().tail(100)
-    data_source = "Alpha Vantage"
-else:
-    print("Alpha Vantage data is incomplete. Falling back to yfinance.")
-    df_combined = fetch_yfinance_data()
-    data_source = "yfinance"
-
-if df_combined.empty:
-    print("No data could be fetched from any source. Exiting.")
-    exit()
-
-# --- 3. Prepare for Power BI ---
-
-df_combined = df_combined.reset_index()
-df_combined.rename(columns={'ReportDate': 'Report Date'}, inplace=True)
-df_combined['Report Date'] = pd.to_datetime(df_combined['Report Date']).dt.date
-
-# --- 4. Save to CSV ---
+def fetch_financial_data(symbol=COMPANY_TICKER, api_key=API_KEY, output_path=OUTPUT_CSV_FILE):
+    """
+    Fetches quarterly statements from Alpha Vantage, falling back to annual yfinance data,
+    and saves them for Power BI. Returns the combined frame, or an empty frame if no
+    source returned data.
+    """
+    print(f"Attempting to fetch quarterly data for {symbol} from Alpha Vantage...")
+    income_statement, balance_sheet, cash_flow = fetch_alpha_vantage_statements([symbol], api_key)[symbol]
+
+    if not income_statement.empty and not balance_sheet.empty and not cash_flow.empty:
+        print("Alpha Vantage data fetched successfully.")
+        df_combined = combine_alpha_vantage_statements(income_statement, balance_sheet, cash_flow)
+        data_source = "Alpha Vantage"
+    else:
+        print("Alpha Vantage data is incomplete. Falling back to yfinance.")
+        df_combined = fetch_yfinance_data(symbol)
+        data_source = "yfinance"
+
+    if df_combined.empty:
+        print("No data could be fetched from any source.")
+        return df_combined
+
+    # --- 3. Prepare for Power BI ---
+    df_combined = df_combined.reset_index()
+    df_combined.rename(columns={'ReportDate': 'Report Date'}, inplace=True)
+    df_combined['Report Date'] = pd.to_datetime(df_combined['Report Date']).dt.date
+
+    # --- 4. Save to CSV ---
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    df_combined.to_csv(output_path, index=False)
+    print(f"\nSuccessfully fetched data from {data_source} and saved to {output_path}")
+    print("The CSV is now ready for your Power BI dashboard.")
+    return df_combined
 
-df_combined.to_csv(OUTPUT_CSV_FILE, index=False)
-print(f"\nSuccessfully fetched data from {data_source} and saved to {OUTPUT_CSV_FILE}")
-print("The CSV is now ready for your Power BI dashboard.")
 
-print("\nSample of Processed Data (First 5 rows):")
-print(df_combined.head())
+if __name__ == "__main__":
+    financial_data = fetch_financial_data()
+    if not financial_data.empty:
+        print("\nSample of Processed Data (First 5 rows):")
+        print(financial_data.head())
 
 # If you have free alpha vantage account, the stock data will not be appear (due to the subscription and limitiation)
-# Hence i will provide stock data using yfinance ()
\ No newline at end of file
+# Hence i will provide stock data using yfinance ()
@@ -0,0 +1,140 @@
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.storage import (DATE_COLUMN, delete_dataset, partition_exists, read_dataset,
+                                       read_partition_metadata, write_dataset, write_partition_metadata)
+from src.utils.config import get_setting
+
+# --- Configuration ---
+# Window lengths in trading days
+VOLATILITY_WINDOW = get_setting('market_features', 'volatility_window', default=63)
+MOMENTUM_WINDOW = get_setting('market_features', 'momentum_window', default=63)
+DRAWDOWN_WINDOW = get_setting('market_features', 'drawdown_window', default=252)
+VOLUME_SHORT_WINDOW = get_setting('market_features', 'volume_short_window', default=21)
+VOLUME_LONG_WINDOW = get_setting('market_features', 'volume_long_window', default=126)
+TRADING_DAYS_PER_YEAR = 252
+FEATURE_WINDOWS = {
+    'volatility': VOLATILITY_WINDOW,
+    'momentum': MOMENTUM_WINDOW,
+    'drawdown': DRAWDOWN_WINDOW,
+    'volume_short': VOLUME_SHORT_WINDOW,
+    'volume_long': VOLUME_LONG_WINDOW,
+}
+
+# Bump whenever the feature formulas change so stored features are recomputed
+FEATURES_VERSION = 1
+# Stored with each ticker's features; a mismatch means they were built with other windows
+FEATURES_CONFIG_HASH = hashlib.sha256(
+    json.dumps({'version': FEATURES_VERSION, 'windows': FEATURE_WINDOWS}, sort_keys=True).encode('utf-8')
+).hexdigest()
+
+MARKET_FEATURE_COLUMNS = ['volatility', 'momentum', 'drawdown', 'volume_trend']
+# Bars of history an appended day needs for all of its windows (+1 for its first return)
+LOOKBACK = max(VOLATILITY_WINDOW, MOMENTUM_WINDOW, DRAWDOWN_WINDOW, VOLUME_LONG_WINDOW) + 1
+
+
+def _sorted_bars(stock_df):
+    df = stock_df
+    if 'ticker' not in df.columns:
+        df = df.assign(ticker='')
+    df = df.assign(**{DATE_COLUMN: pd.to_datetime(df[DATE_COLUMN])})
+    return df.sort_values(['ticker', DATE_COLUMN], kind='stable').reset_index(drop=True)
+
+
+def compute_market_features(stock_df):
+    """
+    Rolling market features for every daily bar of one or many tickers ('ticker' column):
+
+        volatility    annualized std of daily log returns over VOLATILITY_WINDOW days (%)
+        momentum      price change over MOMENTUM_WINDOW days (%)
+        drawdown      distance below the highest close of the last DRAWDOWN_WINDOW days (%)
+        volume_trend  short over long average trading volume, minus one (%)
+
+    All tickers are computed in one pass: the bars are sorted by ticker and date, the
+    windows run over the whole column and windows that would reach into the previous
+    ticker are masked by each row's position within its ticker. Every feature is a
+    ratio, so back-adjusting a ticker's whole history for splits or dividends leaves
+    the values unchanged.
+    """
+    df = _sorted_bars(stock_df)
+    position = df.groupby('ticker', sort=False).cumcount().to_numpy()
+    close = pd.to_numeric(df['adjustedCloseStockPrice'], errors='coerce').astype(np.float64)
+    volume = pd.to_numeric(df['dailyTradingVolume'], errors='coerce').astype(np.float64)
+
+    log_returns = np.log(close).diff().where(position > 0)
+    volatility = log_returns.rolling(VOLATILITY_WINDOW).std() * np.sqrt(TRADING_DAYS_PER_YEAR)
+    momentum = close / close.shift(MOMENTUM_WINDOW) - 1
+    # Until a ticker has a full window, its running maximum is the window maximum
+    running_max = close.groupby(df['ticker'], sort=False).cummax()
+    window_max = close.rolling(DRAWDOWN_WINDOW, min_periods=1).max()
+    peak = np.where(position >= DRAWDOWN_WINDOW - 1, window_max, running_max)
+    volume_trend = volume.rolling(VOLUME_SHORT_WINDOW).mean() / volume.rolling(VOLUME_LONG_WINDOW).mean() - 1
+
+    features = pd.DataFrame({
+        'ticker': df['ticker'],
+        DATE_COLUMN: df[DATE_COLUMN],
+        'volatility': np.where(position >= VOLATILITY_WINDOW, volatility, np.nan) * 100,
+        'momentum': np.where(position >= MOMENTUM_WINDOW, momentum, np.nan) * 100,
+        'drawdown': (close / peak - 1) * 100,
+        'volume_trend': np.where(position >= VOLUME_LONG_WINDOW - 1, volume_trend, np.nan) * 100,
+    })
+    return features if 'ticker' in stock_df.columns else features.drop(columns=['ticker'])
+
+
+def update_market_features(features_df, stock_df):
+    """
+    Extends previously computed features with the bars appended since. Only the new
+    days are computed, each from the LOOKBACK bars before it; tickers without
+    features yet are computed from their full history. Returns the combined frame.
+    """
+    bars = _sorted_bars(stock_df)
+    known = features_df if 'ticker' in features_df.columns else features_df.assign(ticker='')
+    last_date = known.groupby('ticker')[DATE_COLUMN].max()
+    cutoff = bars['ticker'].map(last_date).fillna(pd.Timestamp.min)
+    is_new = (bars[DATE_COLUMN] > cutoff).to_numpy()
+    if not is_new.any():
+        return features_df
+
+    # Keep each ticker's new rows plus the LOOKBACK rows before its first new one
+    position = bars.groupby('ticker', sort=False).cumcount()
+    first_new = position.where(is_new).groupby(bars['ticker'], sort=False).transform('min')
+    window = bars[(position >= first_new - LOOKBACK).to_numpy()]
+    computed = compute_market_features(window)
+    new_rows = computed[(computed[DATE_COLUMN] > computed['ticker'].map(last_date).fillna(pd.Timestamp.min)).to_numpy()]
+
+    if 'ticker' not in features_df.columns:
+        new_rows = new_rows.drop(columns=['ticker'])
+    return pd.concat([features_df, new_rows], ignore_index=True)
+
+
+def load_market_features(stock_df, ticker):
+    """
+    Features for a ticker's daily bars, kept in the Parquet store ('market_features').
+    When the stored features cover the same bars as the start of `stock_df`, only the
+    appended days are computed and only the years they fall in are rewritten; otherwise
+    (first run, history that was re-downloaded with different days, or features stored
+    with other windows or an older FEATURES_VERSION) the ticker's partition is rebuilt.
+    """
+    bars = stock_df.assign(ticker=ticker)
+    current = partition_exists('market_features', ticker) and \
+        read_partition_metadata('market_features', ticker).get('config_hash') == FEATURES_CONFIG_HASH
+    stored = read_dataset('market_features', tickers=[ticker]).drop(columns=['year']) if current else pd.DataFrame()
+
+    dates = pd.to_datetime(bars[DATE_COLUMN])
+    if not stored.empty and (dates <= stored[DATE_COLUMN].max()).sum() == len(stored):
+        features = update_market_features(stored, bars)
+        changed = features.iloc[len(stored):]
+        if not changed.empty:
+            years = set(changed[DATE_COLUMN].dt.year)
+            write_dataset(features[features[DATE_COLUMN].dt.year.isin(years)], 'market_features')
+    else:
+        features = compute_market_features(bars)
+        delete_dataset('market_features', ticker=ticker)
+        write_dataset(features, 'market_features')
+        if not features.empty:
+            write_partition_metadata('market_features', ticker,
+                                     {'config_hash': FEATURES_CONFIG_HASH, 'windows': FEATURE_WINDOWS})
+    return features.drop(columns=['ticker'])
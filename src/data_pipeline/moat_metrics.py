@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.statement_schema import read_statements
+from src.utils.config import get_setting, resolve_path
+
+# --- Configuration ---
+RAW_FINANCIAL_FILE = os.path.join(resolve_path(get_setting('paths', 'raw_data', default='data/raw')), 'nvidia_financial_data.csv')
+
+# Fallback tax rate of the NOPAT measure when the effective rate is undefined
+DEFAULT_TAX_RATE = 0.21
+
+# Raw statement columns the measures read; everything else in the ~90-column file is skipped
+STATEMENT_COLUMNS = [
+    'Report Date', 'ticker', 'PeriodType',
+    'operatingIncome', 'incomeBeforeTax', 'incomeTaxExpense',
+    'totalDebt', 'longTermDebt', 'totalShareholderEquity',
+    'grossProfit', 'totalRevenue', 'researchAndDevelopment',
+    'operatingCashflow', 'capitalExpenditures',
+]
+
+
+def _divide(numerator, denominator, alternate=np.nan):
+    """DAX DIVIDE(): numerator / denominator, or `alternate` where the denominator is 0 or blank."""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    valid = np.isfinite(denominator) & (denominator != 0)
+    return np.where(valid, numerator / np.where(valid, denominator, 1.0), alternate)
+
+
+def _column(df, name):
+    if name not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float64)
+
+
+def load_raw_statements(path=RAW_FINANCIAL_FILE):
+    """Reads only the statement columns the moat measures need, with the schema's compact dtypes."""
+    return read_statements(path, columns=STATEMENT_COLUMNS)
+
+
+def compute_moat_metrics(statements_df, tax_rate=DEFAULT_TAX_RATE):
+    """
+    Computes the Power BI moat measures (powerbi/All_DAX_Formulas.md) for every row of a
+    statement frame at once, so one call covers any number of tickers and quarters:
+
+        NOPAT              = operatingIncome * (1 - DIVIDE(incomeTaxExpense, incomeBeforeTax, 0.21))
+        Invested Capital   = totalDebt + totalShareholderEquity
+        ROIC (%)           = DIVIDE(NOPAT, Invested Capital)
+        Gross Margin %     = DIVIDE(grossProfit, totalRevenue)
+        R&D as % of Revenue = DIVIDE(researchAndDevelopment, totalRevenue)
+        Free Cash Flow     = operatingCashflow - capitalExpenditures
+
+    totalDebt falls back to longTermDebt, which is what the Alpha Vantage statements
+    carry, and a blank debt counts as zero as in DAX. Ratios are returned in percent,
+    matching the numbers in the DAX export. Only quarterly rows are kept; the result has
+    the export's Year/Quarter layout plus the fiscal 'Statement Date' (and 'ticker' when
+    the input has one).
+    """
+    df = statements_df
+    if 'PeriodType' in df.columns:
+        df = df[df['PeriodType'].isna() | (df['PeriodType'] == 'Quarterly')]
+    df = df.reset_index(drop=True)
+
+    operating_income = _column(df, 'operatingIncome')
+    total_revenue = _column(df, 'totalRevenue')
+    gross_profit = _column(df, 'grossProfit')
+
+    effective_tax_rate = _divide(_column(df, 'incomeTaxExpense'), _column(df, 'incomeBeforeTax'), tax_rate)
+    nopat = operating_income * (1 - effective_tax_rate)
+    total_debt = _column(df, 'totalDebt')
+    total_debt = np.where(np.isnan(total_debt), _column(df, 'longTermDebt'), total_debt)
+    # DAX adds blanks as zero (NVIDIA reported no debt before 2016); two blanks stay blank
+    equity = _column(df, 'totalShareholderEquity')
+    invested_capital = np.where(np.isnan(total_debt) & np.isnan(equity), np.nan,
+                                np.nan_to_num(total_debt) + np.nan_to_num(equity))
+
+    report_dates = pd.to_datetime(df['Report Date'])
+    metrics = pd.DataFrame({
+        'Year': report_dates.dt.year,
+        'Quarter': report_dates.dt.quarter,
+        'ROIC (%)': _divide(nopat, invested_capital) * 100,
+        'Gross Margin %': _divide(gross_profit, total_revenue) * 100,
+        'R&D as % of Revenue': _divide(_column(df, 'researchAndDevelopment'), total_revenue) * 100,
+        'Free Cash Flow': _column(df, 'operatingCashflow') - _column(df, 'capitalExpenditures'),
+        'Invested Capital': invested_capital,
+        'NOPAT': nopat,
+        'grossProfit': gross_profit,
+        'Total Revenue': total_revenue,
+        'Statement Date': report_dates,
+    })
+    if 'ticker' in df.columns:
+        metrics.insert(0, 'ticker', df['ticker'].to_numpy())
+    return metrics
+
+
+def load_moat_kpis(path=RAW_FINANCIAL_FILE, start=None):
+    """Moat KPIs computed directly from the raw statement file, optionally from `start` onward."""
+    metrics = compute_moat_metrics(load_raw_statements(path))
+    if start is not None:
+        metrics = metrics[metrics['Statement Date'] >= pd.Timestamp(start)].reset_index(drop=True)
+    return metrics
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.storage import DATE_COLUMN, DATASET_PARTITIONS, write_dataset
+from src.utils.config import get_setting, resolve_path
+
+# --- Configuration ---
+POWERBI_DIR = resolve_path(get_setting('paths', 'powerbi', default='data/powerbi'))
+EXPORT_STATE_FILE = os.path.join(resolve_path(get_setting('cache', 'dir', default='data/cache')), 'powerbi_export_state.json')
+# NVIDIA's fiscal year ends in late January, so fiscal quarters end in Apr/Jul/Oct/Jan
+FISCAL_YEAR_END_MONTH = get_setting('company', 'fiscal_year_end_month', default=1)
+
+ROLLUP_TABLES = {
+    'stock_monthly': 'M',
+    'stock_quarterly': f"Q-{pd.Timestamp(2000, FISCAL_YEAR_END_MONTH, 1).strftime('%b').upper()}",
+}
+
+
+def rollup_prices(stock_df, freq):
+    """
+    Aggregates daily bars of one or many tickers ('ticker' column) into periods of `freq`:
+    closing price, period return, average and total volume and the number of trading days.
+    Every row is tagged with its fiscal year and quarter. Columns use compact dtypes
+    (float32 prices and returns, categorical ticker) to keep the Power BI model small.
+    """
+    df = stock_df[['ticker', DATE_COLUMN, 'adjustedCloseStockPrice', 'dailyTradingVolume']].copy()
+    df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN])
+    df['period'] = df[DATE_COLUMN].dt.to_period(freq)
+    df.sort_values(['ticker', DATE_COLUMN], inplace=True, kind='stable')
+
+    grouped = df.groupby(['ticker', 'period'], sort=True, observed=True)
+    rollup = grouped.agg(
+        close=('adjustedCloseStockPrice', 'last'),
+        avg_volume=('dailyTradingVolume', 'mean'),
+        total_volume=('dailyTradingVolume', 'sum'),
+        trading_days=(DATE_COLUMN, 'size'),
+        period_start=(DATE_COLUMN, 'first'),
+        period_end=(DATE_COLUMN, 'last'),
+    ).reset_index()
+
+    period_return = rollup.groupby('ticker', observed=True)['close'].pct_change()
+    fiscal = rollup['period_end'].dt.to_period(ROLLUP_TABLES['stock_quarterly'])
+
+    return pd.DataFrame({
+        'ticker': rollup['ticker'].astype('category'),
+        DATE_COLUMN: rollup['period_end'],
+        'Period Start': rollup['period_start'],
+        'fiscal_year': fiscal.dt.qyear.astype(np.int16),
+        'Fiscal Quarter': ('Q' + fiscal.dt.quarter.astype(str)).astype('category'),
+        'Close': rollup['close'].astype(np.float32),
+        'Return (%)': (period_return * 100).astype(np.float32),
+        'Average Volume': rollup['avg_volume'].astype(np.float32),
+        'Total Volume': rollup['total_volume'].astype(np.int64),
+        'Trading Days': rollup['trading_days'].astype(np.int8),
+    })
+
+
+def _partition_hashes(df, partition_cols):
+    hashes = {}
+    for key, part in df.groupby(partition_cols, observed=True, sort=False):
+        key = '/'.join(map(str, key if isinstance(key, tuple) else (key,)))
+        hashes[key] = hashlib.sha256(pd.util.hash_pandas_object(part, index=False).values.tobytes()).hexdigest()
+    return hashes
+
+
+def _partition_written(root, table, partition_cols, key):
+    path = os.path.join(root, table, *(f"{col}={value}" for col, value in zip(partition_cols, key.split('/'))))
+    return os.path.isdir(path) and bool(os.listdir(path))
+
+
+def _read_state(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_state(state, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def export_rollups(stock_df, root=POWERBI_DIR, state_file=EXPORT_STATE_FILE):
+    """
+    Writes the monthly and fiscal-quarter rollups as date-partitioned Parquet under
+    root/<table>/ticker=.../year=... (fiscal_year=... for quarters). Only partitions
+    whose contents changed since the last export, or whose files are missing under
+    root, are rewritten, so Power BI incremental refresh reloads just the latest period,
+    or the whole history after a back-adjustment. Tickers absent from stock_df keep
+    their recorded partitions. Returns {table: number of partitions written}.
+    """
+    state = _read_state(state_file)
+    if state.get('root') != root:
+        state = {'root': root}
+    written = {}
+
+    for table, freq in ROLLUP_TABLES.items():
+        rollup = rollup_prices(stock_df, freq)
+        partition_cols = DATASET_PARTITIONS[table]
+        keyed = rollup.assign(year=rollup[DATE_COLUMN].dt.year)
+        hashes = _partition_hashes(keyed, partition_cols)
+
+        previous = state.get(table, {})
+        changed = [key for key, digest in hashes.items()
+                   if previous.get(key) != digest or not _partition_written(root, table, partition_cols, key)]
+        if changed:
+            keys = keyed[partition_cols].astype(str).agg('/'.join, axis=1)
+            write_dataset(rollup[keys.isin(changed).to_numpy()], table, root=root)
+        # Replace the entries of the exported tickers only; other tickers' partitions are untouched
+        tickers = {str(ticker) for ticker in rollup['ticker'].unique()}
+        state[table] = {**{key: digest for key, digest in previous.items() if key.split('/')[0] not in tickers},
+                        **hashes}
+        written[table] = len(changed)
+
+    _write_state(state, state_file)
+    return written
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+from src.utils.config import get_setting, resolve_path
+from src.utils.instrumentation import count
+
+# --- Configuration ---
+CACHE_DIR = resolve_path(get_setting('cache', 'dir', default='data/cache'))
+CACHE_MAX_BYTES = int(get_setting('cache', 'max_size_mb', default=512) * 1024 * 1024)
+CACHE_TTL_HOURS = get_setting('cache', 'ttl_hours', default={}) or {}
+DEFAULT_TTL_HOURS = 24
+
+
+class CacheMissError(Exception):
+    """Raised in offline mode when a response is not available in the cache."""
+
+
+def is_offline():
+    """Offline mode is on when config.yml says so or MOAT_OFFLINE is set."""
+    env = os.environ.get('MOAT_OFFLINE', '').strip().lower()
+    if env:
+        return env not in ('0', 'false', 'no')
+    return bool(get_setting('cache', 'offline', default=False))
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache for API responses.
+    Entries are keyed by source, endpoint, symbol and params, expire after a
+    per-source TTL, and the least recently used entries are evicted once the
+    cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, ttl_hours=None, max_bytes=CACHE_MAX_BYTES, offline=None):
+        self.cache_dir = cache_dir
+        self.ttl_hours = dict(CACHE_TTL_HOURS if ttl_hours is None else ttl_hours)
+        self.max_bytes = max_bytes
+        self.offline = is_offline() if offline is None else offline
+        self.lock = threading.Lock()
+        self._approx_bytes = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(source, endpoint, symbol, params=None):
+        descriptor = json.dumps([source, endpoint, symbol, params or {}], sort_keys=True, default=str)
+        return hashlib.sha256(descriptor.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.pkl")
+
+    def get(self, source, endpoint, symbol, params=None):
+        """Returns the cached value, or None if it is missing or expired (expiry is ignored offline)."""
+        path = self._path(self.make_key(source, endpoint, symbol, params))
+        try:
+            age_hours = (time.time() - os.path.getmtime(path)) / 3600
+        except OSError:
+            if self.offline:
+                raise CacheMissError(f"Offline mode: no cached response for {source} {endpoint} {symbol}")
+            count('cache_misses')
+            return None
+
+        if not self.offline and age_hours > self.ttl_hours.get(source, DEFAULT_TTL_HOURS):
+            count('cache_misses')
+            return None
+
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            count('cache_misses')
+            return None
+        count('cache_hits')
+
+        # Access time drives LRU eviction; mtime stays the write time used for TTLs
+        os.utime(path, (time.time(), entry['written_at']))
+        return entry['value']
+
+    def put(self, source, endpoint, symbol, value, params=None):
+        """Stores a value atomically, then trims the cache back under its size cap."""
+        path = self._path(self.make_key(source, endpoint, symbol, params))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        written_at = time.time()
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump({'written_at': written_at, 'value': value}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        os.utime(path, (written_at, written_at))
+
+        with self.lock:
+            if self._approx_bytes is not None:
+                self._approx_bytes += os.path.getsize(path)
+        if self._approx_bytes is None or self._approx_bytes > self.max_bytes:
+            self.evict()
+
+    def fetch(self, source, endpoint, symbol, loader, params=None):
+        """Returns the cached value, calling loader() and caching its result on a miss."""
+        value = self.get(source, endpoint, symbol, params)
+        if value is None:
+            value = loader()
+            if value is not None and not getattr(value, 'empty', False):
+                self.put(source, endpoint, symbol, value, params)
+        return value
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in max_bytes."""
+        with self.lock:
+            entries = []
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if name.endswith('.pkl'):
+                        stat = os.stat(os.path.join(root, name))
+                        entries.append((stat.st_atime, stat.st_size, os.path.join(root, name)))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+            self._approx_bytes = total
+
+
+_default_cache = None
+
+
+def get_cache():
+    """Returns the process-wide cache configured from config.yml."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache()
+    return _default_cache
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+# --- Schema ---
+# Statement columns the pipeline and the Power BI measures read, with compact dtypes.
+# Everything else in the ~90-column Alpha Vantage statements is never materialized.
+DATE_COLUMN = 'Report Date'
+CATEGORY_COLUMNS = ['ticker', 'PeriodType', 'reportedCurrency']
+NUMERIC_COLUMNS = [
+    'operatingIncome', 'incomeBeforeTax', 'incomeTaxExpense',
+    'totalDebt', 'longTermDebt', 'totalShareholderEquity', 'cashAndCashEquivalentsAtCarryingValue',
+    'grossProfit', 'totalRevenue', 'researchAndDevelopment',
+    'operatingCashflow', 'capitalExpenditures',
+]
+STATEMENT_SCHEMA = {
+    DATE_COLUMN: 'datetime64[ns]',
+    **{col: 'category' for col in CATEGORY_COLUMNS},
+    **{col: 'float32' for col in NUMERIC_COLUMNS},
+}
+
+# Merge leftovers of files written before combine_alpha_vantage_statements dropped them;
+# the first non-empty value of the canonical column and its aliases is kept
+COLUMN_ALIASES = {
+    'PeriodType': ['PeriodType_x', 'PeriodType_y', 'PeriodType_cf'],
+    'reportedCurrency': ['reportedCurrency_x', 'reportedCurrency_y'],
+}
+
+
+def _source_columns(columns):
+    """The file columns that feed `columns`, including their aliases."""
+    sources = set(columns)
+    for col in columns:
+        sources.update(COLUMN_ALIASES.get(col, []))
+    return sources
+
+
+def _coalesce_aliases(df, columns):
+    """Folds alias columns into their canonical column and drops them."""
+    for col in columns:
+        aliases = [alias for alias in COLUMN_ALIASES.get(col, []) if alias in df.columns]
+        if not aliases:
+            continue
+        merged = df[col] if col in df.columns else pd.Series(np.nan, index=df.index, dtype=object)
+        for alias in aliases:
+            merged = merged.fillna(df[alias])
+        df = df.drop(columns=aliases)
+        df[col] = merged
+    return df
+
+
+def read_statements(path, columns=None):
+    """
+    Reads a raw statement CSV according to the schema in one pass: only the schema
+    columns (or the requested subset) are parsed, numbers go straight to float32, the
+    merge leftovers are folded into 'PeriodType'/'reportedCurrency' and the text
+    columns become categoricals.
+    """
+    columns = list(STATEMENT_SCHEMA) if columns is None else list(columns)
+    sources = _source_columns(columns)
+    dtypes = {col: 'float32' for col in NUMERIC_COLUMNS if col in sources}
+    dtypes.update({col: 'object' for col in sources if col not in dtypes and col != DATE_COLUMN})
+
+    df = pd.read_csv(path, usecols=lambda col: col in sources, dtype=dtypes,
+                     parse_dates=[DATE_COLUMN] if DATE_COLUMN in columns else False)
+    df = _coalesce_aliases(df, columns)
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df[[col for col in columns if col in df.columns]]
+
+
+def apply_schema(df, columns=None):
+    """
+    Casts an in-memory statement frame (e.g. a parsed API payload) to the schema: unused
+    columns are dropped first, then every numeric column is converted by a single
+    vectorized to_numeric over the whole block. The index is left untouched.
+    """
+    columns = list(STATEMENT_SCHEMA) if columns is None else list(columns)
+    df = _coalesce_aliases(df.loc[:, [col for col in df.columns if col in _source_columns(columns)]], columns)
+    df = df[[col for col in columns if col in df.columns]].copy()
+
+    numeric = [col for col in NUMERIC_COLUMNS if col in df.columns]
+    if numeric:
+        values = pd.to_numeric(df[numeric].to_numpy(dtype=object).ravel(), errors='coerce')
+        df[numeric] = np.asarray(values, dtype=np.float32).reshape(len(df), len(numeric))
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    if DATE_COLUMN in df.columns:
+        df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN])
+    return df
@@ -1,21 +1,40 @@
+import os
+import tempfile
 import pandas as pd
-import yfinance as yf
+import numpy as np
 import datetime
 
+from src.data_pipeline.response_cache import CacheMissError, get_cache
+from src.data_pipeline.storage import partition_exists, write_dataset
+from src.utils.config import get_setting, resolve_path
+
 # --- Configuration ---
-COMPANY_TICKER = 'NVDA'
-OUTPUT_CSV_FILE = 'nvda_stock_data.csv'
+COMPANY_TICKER = get_setting('company', 'ticker', default='NVDA')
+OUTPUT_CSV_FILE = resolve_path(os.path.join(get_setting('paths', 'processed_data', default='data/processed'), 'nvda_stock_data.csv'))
+HISTORY_START_DATE = pd.Timestamp(get_setting('data_sources', 'yahoo_finance', 'start_date', default='1980-01-01')).date()
+
+# Incremental updates re-download this many calendar days of already stored bars
+# so that split/dividend back-adjustments can be detected against the store.
+RESTATEMENT_OVERLAP_DAYS = 10
+RESTATEMENT_TOLERANCE = 1e-4
 
-def fetch_stock_data(symbol):
+def fetch_stock_data(symbol, start_date=HISTORY_START_DATE):
     """Fetches historical daily adjusted stock data using yfinance."""
+    # Imported lazily so that loading this module never pulls in the network stack
+    import yfinance as yf
+
     try:
         print(f"Fetching historical stock data for {symbol} using yfinance...")
 
-        start_date = datetime.date(1980, 1, 1)
         end_date = datetime.date.today()
 
-        # Fetch data from Yahoo Finance via yfinance
-        df = yf.download(symbol, start=start_date, end=end_date)
+        # Fetch data from Yahoo Finance via yfinance (served from the response cache when fresh).
+        # The end date is left out of the key so offline runs can replay the last download.
+        df = get_cache().fetch(
+            'yfinance_prices', 'download', symbol,
+            lambda: yf.download(symbol, start=start_date, end=end_date),
+            params={'start': start_date},
+        )
 
         if df.empty:
             print(f"Warning: No stock data found for {symbol}.")
@@ -49,19 +68,139 @@ def fetch_stock_data(symbol):
         print(f"Successfully fetched stock data for {symbol}.")
         return stock_df
 
+    except CacheMissError as e:
+        print(f"Warning: {e}")
+        return pd.DataFrame()
+
     except Exception as e:
         print(f"An error occurred while fetching stock data: {e}")
         return pd.DataFrame()
 
+# --- Incremental Updates ---
+
+def write_stock_data_atomically(stock_df, path):
+    """Rewrites the whole store through a temp file so readers never see a partial CSV."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', newline='') as f:
+            stock_df.to_csv(f, index=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def append_stock_data_atomically(new_rows, path):
+    """Appends rows in a single write, truncating back to the original size if it fails."""
+    payload = new_rows.to_csv(index=False, header=False).encode('utf-8')
+    original_size = os.path.getsize(path)
+    with open(path, 'rb+') as f:
+        try:
+            f.seek(0, os.SEEK_END)
+            # Guard against a store that was saved without a trailing newline
+            if original_size and (f.seek(original_size - 1), f.read(1))[1] != b'\n':
+                payload = b'\n' + payload
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.truncate(original_size)
+            raise
+
+def sync_price_store(stock_df, symbol, since=None):
+    """
+    Mirrors the stock data into the Parquet store, rewriting only the years from `since`
+    onward once the ticker's partition exists (otherwise its whole history is written).
+    """
+    if since is not None and partition_exists('stock_prices', symbol):
+        stock_df = stock_df[pd.to_datetime(stock_df['Report Date']).dt.year >= since.year]
+    if not stock_df.empty:
+        write_dataset(stock_df, 'stock_prices', ticker=symbol)
+
+def _uniform_ratio(new_values, old_values):
+    """Returns the common new/old ratio if every overlapping bar moved by the same factor, else None."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = np.asarray(new_values, dtype=float) / np.asarray(old_values, dtype=float)
+    ratios = ratios[np.isfinite(ratios)]
+    if len(ratios) == 0:
+        return None
+    factor = np.median(ratios)
+    return factor if np.all(np.abs(ratios / factor - 1) <= RESTATEMENT_TOLERANCE) else None
+
+def update_stock_data(symbol, path=OUTPUT_CSV_FILE):
+    """
+    Incrementally refreshes the daily stock store at `path`.
+    Only bars after the last stored 'Report Date' (plus a small overlap) are downloaded.
+    New bars are appended in place; if the overlap shows a split or dividend back-adjustment,
+    the stored history is rescaled, and if individual bars were revised, the store is
+    rewritten from the first revised date onward.
+    """
+    if not os.path.exists(path):
+        print(f"No existing stock data at {path}. Fetching full history...")
+        stock_df = fetch_stock_data(symbol)
+        if not stock_df.empty:
+            write_stock_data_atomically(stock_df, path)
+            sync_price_store(stock_df, symbol)
+        return stock_df
+
+    stored_df = pd.read_csv(path, parse_dates=['Report Date'])
+    stored_df['Report Date'] = stored_df['Report Date'].dt.date
+    last_date = stored_df['Report Date'].max()
+    overlap_start = last_date - datetime.timedelta(days=RESTATEMENT_OVERLAP_DAYS)
+
+    print(f"Stored history for {symbol} ends on {last_date}. Fetching bars since {overlap_start}...")
+    delta_df = fetch_stock_data(symbol, start_date=overlap_start)
+    if delta_df.empty:
+        return stored_df
+
+    overlap = stored_df.merge(delta_df, on='Report Date', suffixes=('_old', ''))
+    new_rows = delta_df[delta_df['Report Date'] > last_date]
+
+    price_diff = np.abs(overlap['adjustedCloseStockPrice'] / overlap['adjustedCloseStockPrice_old'] - 1)
+    volume_diff = np.abs(overlap['dailyTradingVolume'] / overlap['dailyTradingVolume_old'] - 1)
+    revised = (price_diff > RESTATEMENT_TOLERANCE) | (volume_diff > RESTATEMENT_TOLERANCE)
+
+    if not revised.any():
+        stock_df = pd.concat([stored_df, new_rows], ignore_index=True)
+        if not new_rows.empty:
+            append_stock_data_atomically(new_rows, path)
+            sync_price_store(stock_df, symbol, since=new_rows['Report Date'].min())
+        print(f"Appended {len(new_rows)} new bars for {symbol}.")
+        return stock_df
+
+    # A split or dividend back-adjusts every bar before the event by one factor, so the
+    # revised bars form a prefix of the overlap and share a common ratio
+    adjusted = overlap[revised]
+    price_factor = _uniform_ratio(adjusted['adjustedCloseStockPrice'], adjusted['adjustedCloseStockPrice_old'])
+    volume_factor = _uniform_ratio(adjusted['dailyTradingVolume'], adjusted['dailyTradingVolume_old'])
+    is_prefix = bool(revised.iloc[0]) and not (revised.astype(int).diff() > 0).any()
+
+    if price_factor is not None and volume_factor is not None and is_prefix:
+        print(f"Detected back-adjustment for {symbol} (price x{price_factor:.6f}, volume x{volume_factor:.6f}). "
+              "Rescaling stored history...")
+        history = stored_df[stored_df['Report Date'] < delta_df['Report Date'].min()].copy()
+        history['adjustedCloseStockPrice'] *= price_factor
+        history['dailyTradingVolume'] = np.round(history['dailyTradingVolume'] * volume_factor).astype('int64')
+        rewrite_from = None
+    else:
+        first_revised = overlap.loc[revised, 'Report Date'].min()
+        print(f"Detected revised bars for {symbol} from {first_revised}. Rewriting from that date...")
+        history = stored_df[stored_df['Report Date'] < first_revised]
+        delta_df = delta_df[delta_df['Report Date'] >= first_revised]
+        rewrite_from = first_revised
+
+    stock_df = pd.concat([history, delta_df], ignore_index=True)
+    write_stock_data_atomically(stock_df, path)
+    sync_price_store(stock_df, symbol, since=rewrite_from)
+    return stock_df
+
 # --- Main Logic ---
-stock_data = fetch_stock_data(COMPANY_TICKER)
 
-if not stock_data.empty:
-    stock_data.to_csv(OUTPUT_CSV_FILE, index=False)
-    print(f"\nSuccessfully saved stock data to {OUTPUT_CSV_FILE}")
-else:
-    print("\nNo data to save. Exiting.")
+if __name__ == "__main__":
+    stock_data = update_stock_data(COMPANY_TICKER)
 
-print("\nSample of Processed Data (First 5 rows):")
-if not stock_data.empty:
-    display(stock_data.head())
\ No newline at end of file
+    if not stock_data.empty:
+        print(f"\nStock data for {COMPANY_TICKER} is up to date in {OUTPUT_CSV_FILE}")
+        print("\nSample of Processed Data (First 5 rows):")
+        print(stock_data.head())
+    else:
+        print("\nNo data to save. Exiting.")
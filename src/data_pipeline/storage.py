@@ -0,0 +1,190 @@
+import json
+import os
+import shutil
+
+import pandas as pd
+
+from src.utils.config import get_setting, resolve_path
+
+# --- Configuration ---
+STORE_DIR = resolve_path(get_setting('paths', 'store', default='data/store'))
+DATE_COLUMN = 'Report Date'
+
+# Hive partition columns per dataset. Daily data is split by year so incremental
+# writes only replace the partitions they touch and date filters skip whole years.
+DATASET_PARTITIONS = {
+    'stock_prices': ['ticker', 'year'],
+    'financial_statements': ['ticker'],
+    'moat_kpis': ['ticker'],
+    'kpi_forecast': ['ticker'],
+    'price_forecast': ['ticker'],
+    'price_forecast_bands': ['ticker'],
+    # Power BI rollups (powerbi_export.py); quarters are partitioned by fiscal year
+    'stock_monthly': ['ticker', 'year'],
+    'stock_quarterly': ['ticker', 'fiscal_year'],
+    # Rolling daily market features (market_features.py)
+    'market_features': ['ticker', 'year'],
+}
+PARTITION_METADATA_FILE = '_settings.json'
+
+
+def _dataset_path(name, root=STORE_DIR):
+    return os.path.join(root, name)
+
+
+def partition_path(name, ticker, root=STORE_DIR):
+    """Directory holding one ticker's partition of a dataset."""
+    return os.path.join(_dataset_path(name, root), f"ticker={ticker}")
+
+
+def partition_exists(name, ticker, root=STORE_DIR):
+    """Returns True if the ticker's partition of the dataset has been written to the store."""
+    return os.path.isdir(partition_path(name, ticker, root))
+
+
+def read_partition_metadata(name, ticker, root=STORE_DIR):
+    """The metadata stored next to a ticker's partition (see write_partition_metadata), or {}."""
+    try:
+        with open(os.path.join(partition_path(name, ticker, root), PARTITION_METADATA_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_partition_metadata(name, ticker, metadata, root=STORE_DIR):
+    """
+    Stores a small JSON record (e.g. the settings the data was built with) in a
+    ticker's partition directory. The leading underscore keeps Parquet reads from
+    picking it up, and delete_dataset for the ticker removes it with the data.
+    """
+    path = partition_path(name, ticker, root)
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, PARTITION_METADATA_FILE), 'w') as f:
+        json.dump(metadata, f, indent=2, sort_keys=True)
+
+
+def dataset_exists(name, root=STORE_DIR):
+    """Returns True if the dataset has been written to the store."""
+    return os.path.isdir(_dataset_path(name, root))
+
+
+def write_dataset(df, name, ticker=None, root=STORE_DIR):
+    """
+    Writes a DataFrame to the partitioned Parquet store.
+    Only the partitions present in `df` are replaced, so callers can write just the
+    years (or tickers) that changed.
+    """
+    partition_cols = DATASET_PARTITIONS.get(name, ['ticker'])
+    df = df.copy()
+    if ticker is not None:
+        df['ticker'] = ticker
+    if DATE_COLUMN in df.columns:
+        df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN])
+    if 'year' in partition_cols:
+        df['year'] = df[DATE_COLUMN].dt.year
+
+    missing = [col for col in partition_cols if col not in df.columns]
+    if missing:
+        raise KeyError(f"Cannot write dataset '{name}': missing partition columns {missing}")
+
+    # pyarrow is imported on first use; runs that only read the CSV exports never load it
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    ds.write_dataset(
+        table,
+        _dataset_path(name, root),
+        format='parquet',
+        partitioning=ds.partitioning(table.select(partition_cols).schema, flavor='hive'),
+        existing_data_behavior='delete_matching',
+        basename_template='part-{i}.parquet',
+    )
+
+
+def read_dataset(name, columns=None, start=None, end=None, tickers=None, memory_map=False, root=STORE_DIR):
+    """
+    Reads a dataset from the Parquet store with column and row-filter pushdown.
+    Only `columns` are decoded, partitions outside `tickers` and the [start, end]
+    date range are skipped, and `memory_map=True` maps files instead of copying them.
+    """
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+
+    partition_cols = DATASET_PARTITIONS.get(name, ['ticker'])
+    dataset = ds.dataset(
+        _dataset_path(name, root),
+        format='parquet',
+        partitioning='hive',
+        filesystem=fs.LocalFileSystem(use_mmap=memory_map),
+    )
+
+    expression = None
+
+    def _and(condition):
+        return condition if expression is None else expression & condition
+
+    if tickers is not None:
+        expression = _and(ds.field('ticker').isin(list(tickers)))
+    if start is not None:
+        start = pd.Timestamp(start)
+        if 'year' in partition_cols:
+            expression = _and(ds.field('year') >= start.year)
+        expression = _and(ds.field(DATE_COLUMN) >= start.to_pydatetime())
+    if end is not None:
+        end = pd.Timestamp(end)
+        if 'year' in partition_cols:
+            expression = _and(ds.field('year') <= end.year)
+        expression = _and(ds.field(DATE_COLUMN) <= end.to_pydatetime())
+
+    table = dataset.to_table(columns=columns, filter=expression)
+    df = table.to_pandas()
+
+    if DATE_COLUMN in df.columns:
+        df.sort_values(DATE_COLUMN, inplace=True, kind='stable')
+        df.reset_index(drop=True, inplace=True)
+    return df
+
+
+def price_source(ticker, csv_path):
+    """Where read_prices takes a ticker's bars from: its stock_prices partition once written, else the CSV."""
+    return partition_path('stock_prices', ticker) if partition_exists('stock_prices', ticker) else csv_path
+
+
+def read_prices(ticker, csv_path, columns=None, start=None, end=None):
+    """
+    Reads daily prices for one ticker from the Parquet store, falling back to the
+    CSV export (still parsing only `columns`) when the ticker has no partition in the
+    store yet, e.g. because only peers have been collected, or the read is empty.
+    """
+    if partition_exists('stock_prices', ticker):
+        df = read_dataset('stock_prices', columns=columns, start=start, end=end, tickers=[ticker])
+        if not df.empty or not os.path.exists(csv_path):
+            return df if columns is not None else df.drop(columns=['ticker', 'year'])
+
+    df = pd.read_csv(csv_path, usecols=columns, parse_dates=[DATE_COLUMN])
+    if start is not None:
+        df = df[df[DATE_COLUMN] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df[DATE_COLUMN] <= pd.Timestamp(end)]
+    return df.sort_values(DATE_COLUMN).reset_index(drop=True)
+
+
+def export_csv(name, csv_path, **read_kwargs):
+    """Exports a dataset to CSV for Power BI, writing dates as plain dates."""
+    df = read_dataset(name, **read_kwargs)
+    df = df.drop(columns=[col for col in ('year',) if col in df.columns])
+    if 'ticker' in df.columns and df['ticker'].nunique() <= 1:
+        df = df.drop(columns=['ticker'])
+    if DATE_COLUMN in df.columns:
+        df[DATE_COLUMN] = df[DATE_COLUMN].dt.date
+    df.to_csv(csv_path, index=False)
+    return csv_path
+
+
+def delete_dataset(name, ticker=None, root=STORE_DIR):
+    """Removes a dataset from the store, or only one ticker's partitions of it."""
+    path = _dataset_path(name, root)
+    if ticker is not None:
+        path = os.path.join(path, f"ticker={ticker}")
+    shutil.rmtree(path, ignore_errors=True)
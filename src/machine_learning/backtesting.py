@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, parallel_config
+from sklearn.metrics import mean_absolute_error, r2_score
+
+from src.machine_learning.training import available_cores, fit_models_concurrently
+from src.utils.config import get_setting
+from src.utils.instrumentation import stage
+
+# --- Configuration ---
+BACKTEST_MIN_TRAIN_SIZE = get_setting('forecasting', 'backtest', 'min_train_size', default=8)
+BACKTEST_TEST_SIZE = get_setting('forecasting', 'backtest', 'test_size', default=1)
+BACKTEST_WINDOW = get_setting('forecasting', 'backtest', 'window', default=None)
+BACKTEST_N_JOBS = get_setting('forecasting', 'backtest', 'n_jobs', default=-1)
+
+
+def walk_forward_splits(n_samples, min_train_size=BACKTEST_MIN_TRAIN_SIZE, test_size=BACKTEST_TEST_SIZE,
+                        step=None, window=BACKTEST_WINDOW):
+    """
+    Returns rolling-origin (train_idx, test_idx) pairs over time-ordered rows.
+    Training always ends before the test block starts. With window=None the training
+    set expands from the first row; with an int it is a rolling window of that many rows.
+    """
+    step = step or test_size
+    min_train_size = min(min_train_size, n_samples - test_size)
+    splits = []
+    for origin in range(min_train_size, n_samples - test_size + 1, step):
+        train_start = 0 if window is None else max(0, origin - window)
+        splits.append((np.arange(train_start, origin), np.arange(origin, origin + test_size)))
+    return splits
+
+
+def _run_fold(models, X, y, fold, train_idx, test_idx, n_threads, keep_models):
+    """Fits fresh copies of all models on one fold and scores them on the following block."""
+    fitted = fit_models_concurrently(models, X[train_idx], y[train_idx], n_threads=n_threads)
+    rows = []
+    for name, model in fitted.items():
+        y_pred = model.predict(X[test_idx])
+        rows.append({
+            'model': name,
+            'fold': fold,
+            'train_start': int(train_idx[0]),
+            'train_end': int(train_idx[-1]),
+            'test_start': int(test_idx[0]),
+            'test_end': int(test_idx[-1]),
+            'MAE': mean_absolute_error(y[test_idx], y_pred),
+            'R-squared': r2_score(y[test_idx], y_pred) if len(test_idx) > 1 else np.nan,
+            'y_true': y[test_idx].tolist(),
+            'y_pred': y_pred.tolist(),
+        })
+    return rows, (fitted if keep_models else None)
+
+
+def run_backtest(X, y, models, splits=None, n_jobs=BACKTEST_N_JOBS, return_models=False, **split_kwargs):
+    """
+    Walk-forward backtest of every model on every fold, fanned out across processes.
+    X and y are converted to arrays once and shared by all folds (joblib memory-maps
+    large arrays into the workers). Each worker fits the candidate models concurrently
+    within its share of the cores. Returns one row per (model, fold) with MAE/R-squared;
+    with return_models=True also returns the models fitted on the last fold.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.ascontiguousarray(y, dtype=np.float64)
+    if splits is None:
+        splits = walk_forward_splits(len(X), **split_kwargs)
+    if not splits:
+        raise ValueError("Not enough rows for a walk-forward backtest.")
+
+    cores = available_cores()
+    n_workers = min(len(splits), cores if n_jobs is None or n_jobs < 0 else n_jobs)
+    threads_per_worker = max(1, cores // n_workers)
+
+    last_fold = len(splits) - 1
+    tasks = [
+        delayed(_run_fold)(models, X, y, fold, train_idx, test_idx, threads_per_worker,
+                           return_models and fold == last_fold)
+        for fold, (train_idx, test_idx) in enumerate(splits)
+    ]
+    # Cap BLAS/OpenMP inside each worker to its share so workers do not oversubscribe the cores
+    with stage('backtest', rows_in=len(X), folds=len(splits), workers=n_workers) as metrics, \
+            parallel_config(backend='loky', inner_max_num_threads=threads_per_worker):
+        outputs = Parallel(n_jobs=n_workers)(tasks)
+        metrics.rows_out = sum(len(rows) for rows, _ in outputs)
+
+    folds_df = pd.DataFrame([row for rows, _ in outputs for row in rows])
+    folds_df['model'] = pd.Categorical(folds_df['model'], categories=list(models), ordered=True)
+    folds_df = folds_df.sort_values(['model', 'fold'], kind='stable').reset_index(drop=True)
+    folds_df['model'] = folds_df['model'].astype(str)
+
+    if return_models:
+        return folds_df, outputs[last_fold][1]
+    return folds_df
+
+
+def summarize_backtest(folds_df):
+    """Aggregates fold results per model, pooling all out-of-sample predictions for R-squared."""
+    summary = {}
+    for name, group in folds_df.groupby('model', sort=False):
+        y_true = np.concatenate(group['y_true'].tolist())
+        y_pred = np.concatenate(group['y_pred'].tolist())
+        summary[name] = {
+            'MAE': mean_absolute_error(y_true, y_pred),
+            'R-squared': r2_score(y_true, y_pred) if len(y_true) > 1 else np.nan,
+            'MAE std': group['MAE'].std(),
+            'folds': len(group),
+        }
+    return summary
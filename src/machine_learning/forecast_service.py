@@ -0,0 +1,298 @@
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from src.data_pipeline.data_processor import COMPANY_TICKER, KPI_COLUMNS, process_data
+from src.machine_learning.scenarios import quantile_bands, sample_kpi_paths, simulate_price_paths
+from src.machine_learning.trend_solver import BatchedTrendModel
+from src.machine_learning.two_stage_forecast import FORECAST_HORIZON, build_stage2_frame, fit_stage2_model
+from src.utils.config import get_setting
+from src.utils.instrumentation import count, stage
+
+# --- Configuration ---
+SERVICE_HOST = get_setting('service', 'host', default='127.0.0.1')
+SERVICE_PORT = get_setting('service', 'port', default=8765)
+# A batch is scored once it holds max_batch_size requests or its oldest request waited max_wait_ms
+MAX_BATCH_SIZE = get_setting('service', 'max_batch_size', default=64)
+MAX_WAIT_MS = get_setting('service', 'max_wait_ms', default=5)
+# Larger scenario requests are clamped to this many Monte Carlo paths
+MAX_SCENARIOS = get_setting('service', 'max_scenarios', default=10000)
+# Pending connections the listening socket queues; keep it above max_batch_size so bursts reach the batcher
+REQUEST_QUEUE_SIZE = get_setting('service', 'request_queue_size', default=128)
+
+
+def finite_number(value, name):
+    """`value` as a float; raises ValueError for non-numbers (strings, booleans, ...) and NaN/inf."""
+    if isinstance(value, bool) or not isinstance(value, (int, float, np.number)):
+        raise ValueError(f"{name} must be a number, got {value!r}")
+    try:
+        number = float(value)
+    except OverflowError:
+        number = float('inf')
+    if not np.isfinite(number):
+        raise ValueError(f"{name} must be finite, got {value!r}")
+    return number
+
+
+def scenario_count(value):
+    """A scenario count from JSON or a query string; raises ValueError unless it is a whole number."""
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f"'scenarios' must be a whole number, got {value!r}") from None
+    number = finite_number(value, "'scenarios'")
+    if not number.is_integer():
+        raise ValueError(f"'scenarios' must be a whole number, got {value!r}")
+    return int(number)
+
+
+class ForecastModel:
+    """
+    The two-stage forecast held in memory: the stage-1 KPI trends and the stage-2 model are
+    fitted (or loaded from the model registry) once, so every request only runs stage 2.
+    `predict_paths` scores many KPI paths at once.
+    """
+
+    def __init__(self, processed_data=None, ticker=COMPANY_TICKER, horizon=FORECAST_HORIZON):
+        financial_df = process_data() if processed_data is None else processed_data.copy()
+        self.ticker = ticker
+        self.horizon = horizon
+        self.kpis = [kpi for kpi in KPI_COLUMNS if kpi in financial_df.columns]
+
+        self.trend_model = BatchedTrendModel().fit(financial_df[self.kpis].to_numpy(dtype=np.float64))
+        self.kpi_point_path = self.trend_model.forecast(horizon)
+        last_date = financial_df['Report Date'].iloc[-1]
+        self.dates = [last_date + timedelta(days=90 * (i + 1)) for i in range(horizon)]
+
+        historical_df, features, market_columns = build_stage2_frame(financial_df, self.kpis)
+        if historical_df.empty:
+            raise ValueError("No overlapping financial and stock history to fit the stage-2 model on.")
+        self.model = fit_stage2_model(historical_df, features, ticker)
+        self.last_price = historical_df['target_price'].iloc[-1]
+        self.last_market = financial_df[market_columns].ffill().iloc[-1].to_numpy(dtype=np.float64)
+
+    def kpi_path(self, shifts=None):
+        """
+        The stage-1 KPI forecast with what-if shifts applied to every horizon step, e.g.
+        {'Gross Margin %': -5} lowers the gross margin by 5 percentage points.
+        """
+        if shifts is not None and not isinstance(shifts, dict):
+            raise TypeError("'shifts' must be an object mapping KPI names to shifts")
+        path = self.kpi_point_path.copy()
+        for kpi, shift in (shifts or {}).items():
+            if kpi not in self.kpis:
+                raise KeyError(f"Unknown KPI '{kpi}'; expected one of {self.kpis}")
+            path[:, self.kpis.index(kpi)] += finite_number(shift, f"Shift of '{kpi}'")
+        return path
+
+    def predict_paths(self, kpi_paths):
+        """Price paths of shape (n_paths, horizon) for KPI paths of shape (n_paths, horizon, n_kpis)."""
+        return simulate_price_paths(self.model, kpi_paths, self.last_price, self.last_market)
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests for a few milliseconds and scores them together, so N
+    simultaneous requests cost one predict call per horizon step instead of N.
+    Each request is an array of KPI paths (n_paths, horizon, n_kpis); `submit` returns a
+    Future resolving to that request's price paths.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='forecast-batcher', daemon=True)
+        self.thread.start()
+
+    def submit(self, kpi_paths):
+        future = Future()
+        self.requests.put((np.asarray(kpi_paths, dtype=np.float64), future))
+        return future
+
+    def close(self):
+        self.requests.put(None)
+        self.thread.join()
+
+    def _next_batch(self):
+        first = self.requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                # Finish this batch, then stop
+                self.requests.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            sizes = [paths.shape[0] for paths, _ in batch]
+            try:
+                prices = self.predict_fn(np.concatenate([paths for paths, _ in batch]))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            count('service_batches')
+            count('service_requests', len(batch))
+            for (_, future), chunk in zip(batch, np.split(prices, np.cumsum(sizes)[:-1])):
+                future.set_result(chunk)
+
+
+class ForecastService:
+    """Answers forecast and what-if requests from a hot ForecastModel through a MicroBatcher."""
+
+    def __init__(self, model, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, max_scenarios=MAX_SCENARIOS):
+        self.model = model
+        self.max_scenarios = max_scenarios
+        self.batcher = MicroBatcher(model.predict_paths, max_batch_size, max_wait_ms)
+
+    def forecast(self, shifts=None, n_scenarios=0):
+        """
+        The price forecast for every horizon step under optional KPI shifts. With
+        n_scenarios > 0 the residual-bootstrapped KPI scenarios are scored in the same
+        batch and their quantile bands are returned too; n_scenarios is clamped to
+        max_scenarios.
+        """
+        n_scenarios = min(max(0, scenario_count(n_scenarios)), self.max_scenarios)
+        point_path = self.model.kpi_path(shifts)
+        paths = point_path[None, :, :]
+        if n_scenarios:
+            paths = np.concatenate([paths, sample_kpi_paths(point_path, self.model.trend_model.residuals_,
+                                                            n_paths=n_scenarios)])
+        prices = self.batcher.submit(paths).result()
+
+        result = {
+            'ticker': self.model.ticker,
+            'shifts': shifts or {},
+            'scenarios': n_scenarios,
+            'forecast': [{'Report Date': date.strftime('%Y-%m-%d'), 'Forecasted Price': float(price),
+                          **{kpi: float(value) for kpi, value in zip(self.model.kpis, kpis)}}
+                         for date, price, kpis in zip(self.model.dates, prices[0], point_path)],
+        }
+        if n_scenarios:
+            bands = quantile_bands([date.strftime('%Y-%m-%d') for date in self.model.dates], prices[1:])
+            result['bands'] = bands.to_dict(orient='records')
+        return result
+
+    def close(self):
+        self.batcher.close()
+
+
+def _json_safe(value):
+    """Replaces NaN and infinite floats (e.g. bands of a degenerate scenario set) with None."""
+    if isinstance(value, dict):
+        return {key: _json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(item) for item in value]
+    if isinstance(value, (float, np.floating)):
+        return float(value) if np.isfinite(value) else None
+    return value
+
+
+def _make_handler(service):
+    class ForecastRequestHandler(BaseHTTPRequestHandler):
+        """
+        GET  /health                          -> model summary
+        GET  /forecast?scenarios=1000         -> baseline forecast (optional quantile bands)
+        POST /whatif {"shifts": {"Gross Margin %": -5}, "scenarios": 0}
+        """
+
+        def _send(self, status, payload):
+            body = json.dumps(_json_safe(payload), default=str, allow_nan=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/health':
+                model = service.model
+                return self._send(200, {'status': 'ok', 'ticker': model.ticker, 'horizon': model.horizon,
+                                        'kpis': model.kpis, 'last_price': float(model.last_price)})
+            if url.path == '/forecast':
+                scenarios = parse_qs(url.query).get('scenarios', ['0'])[0]
+                return self._respond(lambda: service.forecast(n_scenarios=scenarios))
+            self._send(404, {'error': f"Unknown path {url.path}"})
+
+        def do_POST(self):
+            if urlparse(self.path).path != '/whatif':
+                return self._send(404, {'error': f"Unknown path {self.path}"})
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+            except json.JSONDecodeError as e:
+                return self._send(400, {'error': f"Invalid JSON: {e}"})
+            if not isinstance(request, dict):
+                return self._send(400, {'error': "Expected a JSON object with 'shifts' and 'scenarios'"})
+            self._respond(lambda: service.forecast(request.get('shifts'), request.get('scenarios', 0)))
+
+        def _respond(self, fn):
+            try:
+                self._send(200, fn())
+            except (KeyError, ValueError, TypeError) as e:
+                self._send(400, {'error': str(e.args[0]) if e.args else str(e)})
+            except Exception as e:
+                self._send(500, {'error': f"{type(e).__name__}: {e}"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return ForecastRequestHandler
+
+
+class ForecastHTTPServer(ThreadingHTTPServer):
+    """
+    ThreadingHTTPServer with a listen backlog sized for bursts of concurrent clients (the
+    default of 5 resets connections long before the micro-batcher fills a batch) and
+    handler threads that do not block shutdown.
+    """
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class, request_queue_size=REQUEST_QUEUE_SIZE):
+        self.request_queue_size = max(int(request_queue_size), MAX_BATCH_SIZE)
+        super().__init__(server_address, handler_class)
+
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT, processed_data=None, ticker=COMPANY_TICKER):
+    """
+    Loads the features and models once and serves forecasts over HTTP until interrupted.
+    Requests arriving together are scored in one micro-batch.
+    """
+    with stage('service/load') as metrics:
+        service = ForecastService(ForecastModel(processed_data, ticker=ticker))
+        metrics.rows_out = len(service.model.kpis)
+
+    server = ForecastHTTPServer((host, port), _make_handler(service))
+    print(f"Forecast service for {ticker} listening on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
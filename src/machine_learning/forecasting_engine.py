@@ -1,98 +1,73 @@
+import functools
+import os
+
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LinearRegression
 from sklearn.ensemble import RandomForestRegressor
 from xgboost import XGBRegressor
-from sklearn.metrics import mean_absolute_error, r2_score
 
-def run_forecasting_model():
+from src.data_pipeline.data_processor import COMPANY_TICKER, KPI_COLUMNS, process_data
+from src.machine_learning.backtesting import run_backtest, summarize_backtest, walk_forward_splits
+from src.machine_learning.model_registry import get_registry, model_params
+from src.machine_learning.training import select_best_model, warm_start_refit
+from src.machine_learning.tuning import load_tuned_params
+
+def build_lagged_features(combined_df):
     """
-    Loads, preprocesses, and models financial data to forecast stock prices
-    using multiple machine learning models.
+    Adds the next-quarter target price and lagged KPI/price features.
+    Returns the frame (rows with missing features dropped) and the feature column names.
     """
-    # --- 1. Load and Prepare Data ---
-    print("Step 1: Loading and preparing data...")
-    try:
-        # Load the quarterly financial data
-        financial_df = pd.read_csv('nvidia_financial_data_DAX.csv')
-
-        # --- Debugging: Print columns after loading ---
-        print("\nColumns in financial_df after loading:")
-        print(financial_df.columns.tolist())
-        print("-" * 30)
-        # --- End Debugging ---
-
-        # Clean column names (remove leading/trailing spaces)
-        financial_df.columns = financial_df.columns.str.strip()
-
-        # Create 'Report Date' from 'Year' and 'Quarter' columns in financial_df
-        print("Creating 'Report Date' from 'Year' and 'Quarter' columns in financial data...")
-        # Map quarter to a month to create a valid date (assuming quarter ends on the last day of the 3rd, 6th, 9th, 12th month)
-        quarter_to_month_day = {1: '03-31', 2: '06-30', 3: '09-30', 4: '12-31'}
-
-        # --- Corrected logic to handle potential 'Qtr' in Quarter and missing Year/Quarter ---
-        # Ensure 'Year' and 'Quarter' columns exist before accessing them
-        if 'Year' not in financial_df.columns or 'Quarter' not in financial_df.columns:
-             raise KeyError("Missing 'Year' or 'Quarter' column in financial data.")
-
-        # Ensure Year and Quarter are treated as strings before concatenation
-        financial_df['Quarter'] = financial_df['Quarter'].astype(str).str.replace('Qtr ', '')
-        # Convert Quarter to numeric, coercing errors to NaN
-        financial_df['Quarter_num'] = pd.to_numeric(financial_df['Quarter'], errors='coerce')
-
-        # Drop rows where Quarter could not be converted to numeric
-        financial_df.dropna(subset=['Year', 'Quarter_num'], inplace=True)
-        financial_df['Quarter_num'] = financial_df['Quarter_num'].astype(int) # Convert to int after dropping NaNs
-
-
-        financial_df['Report Date'] = financial_df['Year'].astype(str) + '-' + financial_df['Quarter_num'].map(quarter_to_month_day).astype(str)
-        financial_df['Report Date'] = pd.to_datetime(financial_df['Report Date'], errors='coerce')
-
-        # Remove rows with invalid dates (NaT)
-        financial_df.dropna(subset=['Report Date'], inplace=True)
-        financial_df.sort_values('Report Date', inplace=True)
-
-        # Load the daily stock price data (User-provided CSV)
-        stock_df = pd.read_csv('nvda_stock_data.csv')
-        # Ensure 'Report Date' is datetime and sort
-        stock_df['Report Date'] = pd.to_datetime(stock_df['Report Date'])
-        # Sort by 'Report Date'
-        stock_df.sort_values('Report Date', inplace=True)
-
-        # Merge datasets by finding the stock price closest to each report date
-        combined_df = pd.merge_asof(
-            financial_df, # financial_df now has 'Report Date' and is sorted
-            stock_df[['Report Date', 'adjustedCloseStockPrice']],
-            left_on='Report Date',
-            right_on='Report Date',
-            direction='nearest',
-            suffixes=('', '_stock')
-        )
+    # Drop rows with any missing values for now to simplify the model
+    # Ensure the KPI columns exist before dropping NaNs
+    columns_to_check = ['adjustedCloseStockPrice'] + [kpi for kpi in KPI_COLUMNS if kpi in combined_df.columns]
 
-        # Clean percentage columns and convert to numeric
-        percentage_cols = ['ROIC (%)', 'Gross Margin %', 'R&D as % of Revenue']
-        for col in percentage_cols:
-            if col in combined_df.columns:
-                combined_df[col] = combined_df[col].astype(str).str.replace('%', '').replace('', np.nan)
-                combined_df[col] = pd.to_numeric(combined_df[col], errors='coerce')
+    # Drop rows where any of the essential columns (including selected KPIs) are missing
+    combined_df = combined_df.dropna(subset=columns_to_check).copy()
 
-        # Ensure Free Cash Flow is numeric
-        if 'Free Cash Flow' in combined_df.columns:
-            combined_df['Free Cash Flow'] = pd.to_numeric(combined_df['Free Cash Flow'], errors='coerce')
+    # Target variable (what we want to predict)
+    combined_df['target_price'] = combined_df['adjustedCloseStockPrice'].shift(-1)
 
+    # Create lagged features for key KPIs and the stock price
+    # Ensure the KPI columns exist before creating lagged features
+    features = []
+    for kpi in KPI_COLUMNS:
+        if kpi in combined_df.columns:
+            combined_df[f'lagged_{kpi}'] = combined_df[kpi].shift(1)
+            features.append(f'lagged_{kpi}')
 
-        # Drop rows with any missing values for now to simplify the model
-        # Ensure the KPI columns exist before dropping NaNs
-        kpis_to_check = percentage_cols + ['Free Cash Flow'] # Use the cleaned list
-        columns_to_check = ['adjustedCloseStockPrice'] + [kpi for kpi in kpis_to_check if kpi in combined_df.columns]
+    combined_df['lagged_adj_close'] = combined_df['adjustedCloseStockPrice'].shift(1)
+    features.append('lagged_adj_close')
 
-        # Drop rows where any of the essential columns (including selected KPIs) are missing
-        combined_df.dropna(subset=columns_to_check, inplace=True)
+    # Drop rows with any NaN after creating lagged features and the target variable
+    combined_df.dropna(subset=features + ['target_price'], inplace=True)
+    return combined_df, features
 
+def build_candidate_models(ticker=COMPANY_TICKER):
+    """Candidate models, using the ticker's tuned hyperparameters when tuning.py has saved them."""
+    return {
+        'Linear Regression': LinearRegression(),
+        'Random Forest': RandomForestRegressor(**{'n_estimators': 100, 'random_state': 42,
+                                                  **load_tuned_params('Random Forest', ticker)}),
+        'XGBoost': XGBRegressor(**{'n_estimators': 100, 'random_state': 42, **load_tuned_params('XGBoost', ticker)})
+    }
+
+def run_forecasting_model(processed_data=None, ticker=COMPANY_TICKER, output_dir='.'):
+    """
+    Loads, preprocesses, and models financial data to forecast stock prices
+    using multiple machine learning models.
+    Pass the frame from data_processor.process_data to skip re-parsing the inputs.
+    Cached models are kept per `ticker`; the forecast CSV is written to `output_dir`
+    (None skips it).
+    """
+    # --- 1. Load and Prepare Data ---
+    print("Step 1: Loading and preparing data...")
+    try:
+        # Quarterly KPIs merged with the closest stock price (parsed once by the shared processor)
+        combined_df = process_data() if processed_data is None else processed_data.copy()
 
     except FileNotFoundError as e:
-        print(f"Error: {e}. Please ensure both 'nvidia_financial_data_DAX.csv' and 'nvda_stock_data.csv' are in the same folder.")
+        print(f"Error: {e}. Please ensure both 'nvidia_financial_data_DAX.csv' and 'nvda_stock_data.csv' are in the processed data folder.")
         return
     except KeyError as e:
         print(f"Error: Missing expected column in one of the dataframes: {e}")
@@ -104,23 +79,7 @@ def run_forecasting_model():
 
     # --- 2. Feature Engineering ---
     print("Step 2: Creating new features...")
-    # Target variable (what we want to predict)
-    combined_df['target_price'] = combined_df['adjustedCloseStockPrice'].shift(-1)
-
-    # Create lagged features for key KPIs and the stock price
-    # Ensure the KPI columns exist before creating lagged features
-    features = []
-    kpis_to_lag = percentage_cols + ['Free Cash Flow'] # Use the cleaned list
-    for kpi in kpis_to_lag:
-        if kpi in combined_df.columns:
-            combined_df[f'lagged_{kpi}'] = combined_df[kpi].shift(1)
-            features.append(f'lagged_{kpi}')
-
-    combined_df['lagged_adj_close'] = combined_df['adjustedCloseStockPrice'].shift(1)
-    features.append('lagged_adj_close')
-
-    # Drop rows with any NaN after creating lagged features and the target variable
-    combined_df.dropna(subset=features + ['target_price'], inplace=True)
+    combined_df, features = build_lagged_features(combined_df)
 
 
     # --- 3. Define Features (X) and Target (y) ---
@@ -128,38 +87,35 @@ def run_forecasting_model():
     X = combined_df[features]
     y = combined_df['target_price']
 
-    # Check if there's enough data after dropping NaNs to split
-    if len(X) < 2:
+    # Check if there's enough data after dropping NaNs to backtest
+    if len(X) < 3:
         print("Error: Not enough data points remaining after cleaning to train the model.")
         return
 
-
-    # Split data into training and testing sets
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
     # --- 4. Train and Evaluate Models ---
-    print("Step 3: Training and evaluating models...")
-    models = {
-        'Linear Regression': LinearRegression(),
-        'Random Forest': RandomForestRegressor(n_estimators=100, random_state=42),
-        'XGBoost': XGBRegressor(n_estimators=100, random_state=42)
+    # Walk-forward backtest: every fold trains only on quarters before the ones it predicts
+    print("Step 3: Training and evaluating models (walk-forward backtest)...")
+    models = build_candidate_models(ticker)
+
+    # Backtests are cached in the model registry, so unchanged inputs skip retraining entirely
+    registry = get_registry()
+    splits = walk_forward_splits(len(X))
+    backtest_params = {
+        'models': {name: model_params(model) for name, model in models.items()},
+        'splits': [(int(train[0]), int(test[0]), len(test)) for train, test in splits],
     }
-
-    results = {}
-    for name, model in models.items():
-        model.fit(X_train, y_train)
-        y_pred = model.predict(X_test)
-
-        mae = mean_absolute_error(y_test, y_pred)
-        r2 = r2_score(y_test, y_pred)
-
-        results[name] = {'MAE': mae, 'R-squared': r2}
+    backtest_df, last_fold_models = registry.get_or_train(
+        f'{ticker}/forecasting_engine/backtest', features, backtest_params, X, y,
+        train_fn=lambda X_, y_: run_backtest(X_, y_, models, splits=splits, return_models=True)
+    )
+    results = summarize_backtest(backtest_df)
 
     print("\nModel Performance Results:")
     for name, metrics in results.items():
         print(f"--- {name} ---")
         print(f"  Mean Absolute Error (MAE): ${metrics['MAE']:.2f}")
         print(f"  R-squared: {metrics['R-squared']:.2f}")
+        print(f"  Folds: {metrics['folds']} (MAE std ${metrics['MAE std']:.2f})")
 
     # --- 5. Generate and Save a Sample Forecast ---
     print("\nStep 4: Generating and saving a sample forecast...")
@@ -168,12 +124,22 @@ def run_forecasting_model():
     if not X.empty:
         last_data_point = X.tail(1)
 
-        # Use the best-performing model to make a simple forecast
-        # For this example, let's assume XGBoost is the best
-        best_model = XGBRegressor(n_estimators=100, random_state=42)
-        best_model.fit(X, y) # Train on full dataset
+        # Use the best-performing model from the backtest. It was fitted on every row
+        # before the last test block, so warm-start it with those rows instead of
+        # training a new model from zero.
+        best_name = select_best_model(results)
+        print(f"Best model by walk-forward MAE: {best_name}")
+        # The registry reuses the final model for unchanged data and continues it from the
+        # previous run's model when only new quarters were appended.
+        n_new_rows = len(X) - len(splits[-1][0])
+        best_model = registry.get_or_train(
+            f'{ticker}/forecasting_engine/{best_name}', features, model_params(models[best_name]), X, y,
+            train_fn=lambda X_, y_: warm_start_refit(last_fold_models[best_name], X_, y_, n_new_rows,
+                                                     base_model=models[best_name]),
+            update_fn=functools.partial(warm_start_refit, base_model=models[best_name])
+        )
 
-        predicted_price = best_model.predict(last_data_point)
+        predicted_price = best_model.predict(last_data_point.to_numpy(dtype=np.float64))
 
         # Create a DataFrame for the forecast to be used in Power BI
         # Use the date of the last data point + an appropriate time offset (e.g., 3 months for quarterly)
@@ -184,10 +150,14 @@ def run_forecasting_model():
             'Forecasted Price': predicted_price
         })
 
-        forecast_df.to_csv('price_forecast.csv', index=False)
-        print("Forecast successfully saved to 'price_forecast.csv'")
+        if output_dir is not None:
+            forecast_df.to_csv(os.path.join(output_dir, 'price_forecast.csv'), index=False)
+            print("Forecast successfully saved to 'price_forecast.csv'")
     else:
         print("Could not generate forecast as there is no data to predict from.")
+        best_name, forecast_df = None, None
+
+    return {'metrics': results, 'backtest': backtest_df, 'best_model': best_name, 'forecast': forecast_df}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import joblib
+import numpy as np
+
+from src.utils.config import get_setting, resolve_path
+from src.utils.instrumentation import count, stage
+
+# --- Configuration ---
+REGISTRY_DIR = resolve_path(get_setting('paths', 'models', default='data/models'))
+
+# Parameters that change how fast a model trains but not what it learns
+NON_SEMANTIC_PARAMS = ('n_jobs', 'nthread', 'verbosity', 'verbose')
+
+
+def fingerprint_arrays(X, y=None):
+    """Hashes training data by value, shape and dtype."""
+    digest = hashlib.sha256()
+    for array in (X, y):
+        if array is None:
+            continue
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.shape}{array.dtype}".encode('utf-8'))
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def model_params(model):
+    """Returns the hyperparameters that define a model, without thread/verbosity settings."""
+    if model is None or not hasattr(model, 'get_params'):
+        return {}
+    return {k: v for k, v in model.get_params().items() if k not in NON_SEMANTIC_PARAMS}
+
+
+def ensemble_size(artifact):
+    """Boosting rounds or trees of a fitted ensemble model, or None for anything else."""
+    if hasattr(artifact, 'get_booster'):
+        return int(artifact.get_booster().num_boosted_rounds())
+    if hasattr(artifact, 'estimators_'):
+        return len(artifact.estimators_)
+    return None
+
+
+def _family_key(name, features, params):
+    descriptor = json.dumps([name, list(features), params], sort_keys=True, default=str)
+    return hashlib.sha256(descriptor.encode('utf-8')).hexdigest()[:24]
+
+
+class ModelRegistry:
+    """
+    Local registry of fitted models.
+    A model family is identified by its name, feature list and hyperparameters; within a
+    family each artifact is keyed by a fingerprint of the data it was trained on. When the
+    training data grows by appended rows, the newest artifact trained on a prefix of the
+    data can be updated incrementally instead of retraining from scratch.
+    """
+
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = root
+        self.lock = threading.Lock()
+
+    def _family_dir(self, family):
+        return os.path.join(self.root, family)
+
+    def _read_index(self, family):
+        try:
+            with open(os.path.join(self._family_dir(family), 'index.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _write_index(self, family, index):
+        path = os.path.join(self._family_dir(family), 'index.json')
+        fd, tmp_path = tempfile.mkstemp(dir=self._family_dir(family), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def load(self, name, features, params, X, y=None):
+        """Returns the artifact trained on exactly this data, or None."""
+        family = _family_key(name, features, params)
+        data_fingerprint = fingerprint_arrays(X, y)
+        for entry in self._read_index(family):
+            if entry['data_fingerprint'] == data_fingerprint:
+                return self._load_file(family, entry)
+        return None
+
+    def _load_file(self, family, entry):
+        try:
+            return joblib.load(os.path.join(self._family_dir(family), entry['file']))
+        except (OSError, EOFError, ValueError):
+            return None
+
+    def save(self, name, features, params, X, y, artifact):
+        """Serializes an artifact under the fingerprint of its training data."""
+        family = _family_key(name, features, params)
+        data_fingerprint = fingerprint_arrays(X, y)
+        os.makedirs(self._family_dir(family), exist_ok=True)
+
+        file_name = f"{data_fingerprint[:24]}.joblib"
+        fd, tmp_path = tempfile.mkstemp(dir=self._family_dir(family), suffix='.tmp')
+        os.close(fd)
+        joblib.dump(artifact, tmp_path)
+        os.replace(tmp_path, os.path.join(self._family_dir(family), file_name))
+
+        entry = {
+            'name': name,
+            'n_rows': int(len(X)),
+            'data_fingerprint': data_fingerprint,
+            'file': file_name,
+        }
+        # Warm-started ensembles grow with every update; the index shows by how much
+        size = ensemble_size(artifact)
+        if size is not None:
+            entry['ensemble_size'] = size
+        with self.lock:
+            index = [e for e in self._read_index(family) if e['data_fingerprint'] != data_fingerprint]
+            index.append(entry)
+            self._write_index(family, index)
+
+    def find_prefix(self, name, features, params, X, y=None):
+        """
+        Returns (artifact, n_rows) for the largest artifact trained on the first n_rows of
+        this data, or (None, 0) if no earlier version exists.
+        """
+        family = _family_key(name, features, params)
+        for entry in sorted(self._read_index(family), key=lambda e: e['n_rows'], reverse=True):
+            n_rows = entry['n_rows']
+            if n_rows >= len(X):
+                continue
+            prefix_y = None if y is None else y[:n_rows]
+            if entry['data_fingerprint'] == fingerprint_arrays(X[:n_rows], prefix_y):
+                artifact = self._load_file(family, entry)
+                if artifact is not None:
+                    return artifact, n_rows
+        return None, 0
+
+    def get_or_train(self, name, features, params, X, y, train_fn, update_fn=None):
+        """
+        Returns a fitted artifact for (name, features, params, data):
+        - loads it when this exact data was seen before;
+        - otherwise, if update_fn is given and an artifact exists for a prefix of the data,
+          calls update_fn(artifact, X, y, n_new_rows);
+        - otherwise calls train_fn(X, y).
+        The result is saved before it is returned.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        y = None if y is None else np.ascontiguousarray(y, dtype=np.float64)
+
+        artifact = self.load(name, features, params, X, y)
+        if artifact is not None:
+            count('registry_hits')
+            print(f"Loaded cached model '{name}' from the registry.")
+            return artifact
+
+        previous, n_rows = (None, 0) if update_fn is None else self.find_prefix(name, features, params, X, y)
+        if previous is not None:
+            count('registry_updates')
+            print(f"Updating cached model '{name}' with {len(X) - n_rows} new rows.")
+            with stage(f'fit/{name}', rows_in=len(X), mode='update'):
+                artifact = update_fn(previous, X, y, len(X) - n_rows)
+        else:
+            count('registry_misses')
+            with stage(f'fit/{name}', rows_in=len(X), mode='train'):
+                artifact = train_fn(X, y)
+
+        self.save(name, features, params, X, y, artifact)
+        return artifact
+
+
+_default_registry = None
+
+
+def get_registry():
+    """Returns the process-wide registry configured from config.yml."""
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = ModelRegistry()
+    return _default_registry
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from src.utils.config import get_setting
+
+# --- Configuration ---
+N_SCENARIOS = get_setting('forecasting', 'scenarios', 'n_paths', default=5000)
+SCENARIO_QUANTILES = get_setting('forecasting', 'scenarios', 'quantiles', default=[0.05, 0.25, 0.5, 0.75, 0.95])
+SCENARIO_SEED = get_setting('forecasting', 'random_state', default=42)
+
+
+def sample_kpi_paths(point_forecasts, residuals, n_paths=N_SCENARIOS, seed=SCENARIO_SEED):
+    """
+    Samples KPI scenario paths around the stage-1 trend forecasts.
+    Whole residual rows are bootstrapped, so the historical co-movement between KPIs is
+    kept. Returns an array of shape (n_paths, horizon, n_kpis).
+    """
+    point_forecasts = np.asarray(point_forecasts, dtype=np.float64)
+    residuals = np.nan_to_num(np.asarray(residuals, dtype=np.float64), nan=0.0)
+    horizon = point_forecasts.shape[0]
+
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, residuals.shape[0], size=(n_paths, horizon))
+    return point_forecasts[None, :, :] + residuals[rows]
+
+
+def simulate_price_paths(model, kpi_paths, last_price, market_features=()):
+    """
+    Pushes every KPI path through the stage-2 model recursively.
+    Step h uses the KPIs of step h and the price predicted at step h-1 as its lagged
+    features, and all scenarios are scored in a single predict call per step.
+    `market_features` (the latest observed values) are held constant over the horizon.
+    Returns an array of shape (n_paths, horizon).
+    """
+    n_paths, horizon, _ = kpi_paths.shape
+    prices = np.empty((n_paths, horizon), dtype=np.float64)
+    lagged_price = np.full(n_paths, last_price, dtype=np.float64)
+    market = np.broadcast_to(np.asarray(market_features, dtype=np.float64), (n_paths, len(market_features)))
+
+    for step in range(horizon):
+        features = np.column_stack([kpi_paths[:, step, :], lagged_price, market])
+        prices[:, step] = model.predict(features)
+        lagged_price = prices[:, step]
+
+    return prices
+
+
+def quantile_bands(dates, price_paths, quantiles=SCENARIO_QUANTILES):
+    """Summarizes simulated price paths into per-date quantile bands."""
+    bands = np.quantile(price_paths, quantiles, axis=0).T
+    bands_df = pd.DataFrame(bands, columns=[f'P{round(q * 100):02d}' for q in quantiles])
+    bands_df.insert(0, 'Mean', price_paths.mean(axis=0))
+    bands_df.insert(0, 'Report Date', list(dates))
+    return bands_df
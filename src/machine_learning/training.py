@@ -0,0 +1,91 @@
+import copy
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from sklearn.base import clone
+from threadpoolctl import threadpool_limits
+from xgboost import XGBRegressor
+from sklearn.ensemble import RandomForestRegressor
+
+from src.machine_learning.model_registry import ensemble_size
+from src.utils.config import get_setting
+from src.utils.instrumentation import stage
+
+# --- Configuration ---
+# Warm starts add rounds/trees with every update; past this multiple of the configured
+# n_estimators the model is refit from scratch instead
+WARM_START_MAX_GROWTH = get_setting('forecasting', 'warm_start_max_growth', default=2.0)
+
+
+def available_cores():
+    """Number of cores this process may use (capped by MOAT_MAX_CORES in pool workers)."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    return max(1, min(cores, int(os.environ.get('MOAT_MAX_CORES') or cores)))
+
+
+def allocate_threads(models, n_threads=None):
+    """
+    Splits a thread budget across candidate models. Models with an n_jobs parameter
+    (Random Forest, XGBoost) share the budget; the rest are single-threaded anyway.
+    """
+    n_threads = n_threads or available_cores()
+    parallel = [name for name, model in models.items() if 'n_jobs' in model.get_params()]
+    per_model = max(1, n_threads // max(1, len(parallel)))
+    return {name: (per_model if name in parallel else 1) for name in models}
+
+
+def fit_models_concurrently(models, X, y, n_threads=None):
+    """
+    Fits fresh copies of all candidate models at the same time on a thread pool.
+    sklearn and xgboost release the GIL while fitting, so models overlap, while each
+    model's own n_jobs is capped to its share of n_threads and BLAS is pinned to one
+    thread so the process never runs more threads than it has cores.
+    """
+    budget = allocate_threads(models, n_threads)
+
+    def _fit(name):
+        model = clone(models[name])
+        if 'n_jobs' in model.get_params():
+            model.set_params(n_jobs=budget[name])
+        with stage(f'fit/{name}', rows_in=len(X), threads=budget[name]):
+            return name, model.fit(X, y)
+
+    with threadpool_limits(limits=1, user_api='blas'), ThreadPoolExecutor(max_workers=len(models)) as executor:
+        return dict(executor.map(_fit, models))
+
+
+def select_best_model(metrics, score='MAE'):
+    """Returns the name of the model with the lowest backtest error."""
+    return min(metrics, key=lambda name: metrics[name][score])
+
+
+def warm_start_refit(model, X, y, n_new_rows, base_model=None, max_growth=WARM_START_MAX_GROWTH):
+    """
+    Updates a model fitted on the first len(X) - n_new_rows rows to cover all of X.
+    XGBoost continues boosting from the existing booster and Random Forest grows extra
+    trees, each in proportion to the share of new rows, instead of training from zero;
+    the cached model is left untouched and the update's n_estimators is the cumulative
+    count. Once the ensemble would exceed `max_growth` times the n_estimators of
+    `base_model` (the configured, unfitted model; defaults to `model`) it is refit from
+    scratch. Other models are cheap closed-form fits and are simply refit.
+    """
+    base_model = model if base_model is None else base_model
+    size = ensemble_size(model)
+    if size is None or not isinstance(model, (XGBRegressor, RandomForestRegressor)):
+        return clone(base_model).fit(X, y)
+
+    extra = max(1, math.ceil(size * n_new_rows / max(1, len(X))))
+    if size + extra > max_growth * base_model.get_params()['n_estimators']:
+        return clone(base_model).fit(X, y)
+
+    if isinstance(model, XGBRegressor):
+        updated = clone(model).set_params(n_estimators=extra).fit(X, y, xgb_model=model.get_booster().copy())
+        return updated.set_params(n_estimators=size + extra)
+
+    updated = copy.deepcopy(model)
+    updated.set_params(warm_start=True, n_estimators=size + extra)
+    return updated.fit(X, y)
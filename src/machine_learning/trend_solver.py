@@ -0,0 +1,71 @@
+import numpy as np
+
+from src.utils.config import get_setting
+
+# --- Configuration ---
+TREND_DEGREE = get_setting('forecasting', 'trend', 'degree', default=1)
+TREND_SEASONAL_PERIOD = get_setting('forecasting', 'trend', 'seasonal_period', default=None)
+
+
+def design_matrix(time_index, degree=TREND_DEGREE, seasonal_period=None, scale=1.0):
+    """
+    Builds trend regressors: intercept, polynomial terms of the (scaled) time index and,
+    optionally, one dummy per season except the first.
+    """
+    t = np.asarray(time_index, dtype=np.float64) / scale
+    columns = [t ** power for power in range(degree + 1)]
+    if seasonal_period:
+        season = np.asarray(time_index, dtype=np.int64) % seasonal_period
+        columns += [(season == s).astype(np.float64) for s in range(1, seasonal_period)]
+    return np.column_stack(columns)
+
+
+class BatchedTrendModel:
+    """
+    Fits an independent least-squares trend to every column of a (time x series) matrix
+    in one batched computation. Missing values are masked per column, so a gap in one
+    KPI never shifts the rows used for another. Columns with fewer observations than
+    regressors get NaN coefficients.
+    """
+
+    def __init__(self, degree=TREND_DEGREE, seasonal_period=TREND_SEASONAL_PERIOD):
+        self.degree = degree
+        self.seasonal_period = seasonal_period
+
+    def fit(self, Y, time_index=None):
+        Y = np.asarray(Y, dtype=np.float64)
+        if Y.ndim == 1:
+            Y = Y[:, None]
+        n_obs = Y.shape[0]
+        self.time_index_ = np.arange(n_obs) if time_index is None else np.asarray(time_index)
+        # Scaling the time index keeps higher-order terms well conditioned
+        self.scale_ = float(max(1, np.max(np.abs(self.time_index_))))
+
+        X = design_matrix(self.time_index_, self.degree, self.seasonal_period, self.scale_)
+        mask = np.isfinite(Y)
+        weights = mask.astype(np.float64)
+        Y_filled = np.where(mask, Y, 0.0)
+
+        # Per-column normal equations, all at once: (K, P, P) and (K, P)
+        xtx = np.einsum('tp,tk,tq->kpq', X, weights, X)
+        xty = np.einsum('tp,tk->kp', X, Y_filled)
+
+        coefficients = np.einsum('kpq,kq->kp', np.linalg.pinv(xtx), xty)
+        self.n_obs_ = mask.sum(axis=0)
+        coefficients[self.n_obs_ < X.shape[1]] = np.nan
+        self.coef_ = coefficients
+
+        fitted = X @ coefficients.T
+        self.residuals_ = np.where(mask, Y - fitted, np.nan)
+        return self
+
+    def predict(self, time_index):
+        """Returns the trend value of every series at each requested time index, shape (T, K)."""
+        X = design_matrix(time_index, self.degree, self.seasonal_period, self.scale_)
+        return X @ self.coef_.T
+
+    def forecast(self, horizon):
+        """Forecasts `horizon` steps past the last fitted time index, shape (horizon, K)."""
+        last = int(np.max(self.time_index_))
+        return self.predict(np.arange(last + 1, last + 1 + horizon))
+
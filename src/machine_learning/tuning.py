@@ -0,0 +1,182 @@
+import json
+import math
+import os
+import tempfile
+from datetime import datetime
+
+import numpy as np
+from joblib import Parallel, delayed, parallel_config
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import ParameterSampler
+from xgboost import XGBRegressor
+
+from src.utils.config import get_setting, resolve_path
+
+# --- Configuration ---
+COMPANY_TICKER = get_setting('company', 'ticker', default='NVDA')
+TUNED_PARAMS_FILE = os.path.join(resolve_path(get_setting('paths', 'models', default='data/models')), 'tuned_params.json')
+TUNING_CANDIDATES = get_setting('forecasting', 'tuning', 'n_candidates', default=27)
+TUNING_MIN_ESTIMATORS = get_setting('forecasting', 'tuning', 'min_estimators', default=25)
+TUNING_MAX_ESTIMATORS = get_setting('forecasting', 'tuning', 'max_estimators', default=400)
+TUNING_HALVING_FACTOR = get_setting('forecasting', 'tuning', 'halving_factor', default=3)
+TUNING_N_JOBS = get_setting('forecasting', 'tuning', 'n_jobs', default=-1)
+RANDOM_STATE = get_setting('forecasting', 'random_state', default=42)
+# The two-stage price model has different features, so it is tuned and saved separately
+STAGE2_MODEL_NAME = 'Two-Stage XGBoost'
+
+# n_estimators is the budget successive halving grows, so it is not part of the search space
+SEARCH_SPACES = {
+    'Random Forest': (
+        RandomForestRegressor(random_state=RANDOM_STATE),
+        {
+            'max_depth': [None, 3, 5, 8],
+            'min_samples_leaf': [1, 2, 4],
+            'max_features': [1.0, 0.5, 'sqrt'],
+        },
+    ),
+    'XGBoost': (
+        XGBRegressor(random_state=RANDOM_STATE),
+        {
+            'max_depth': [2, 3, 4, 6],
+            'learning_rate': [0.03, 0.1, 0.3],
+            'subsample': [0.7, 1.0],
+            'min_child_weight': [1, 3],
+        },
+    ),
+}
+
+
+def build_fold_cache(X, y, splits):
+    """Slices every walk-forward fold once so candidates never re-slice the frame."""
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.ascontiguousarray(y, dtype=np.float64)
+    return [(X[train_idx], y[train_idx], X[test_idx], y[test_idx]) for train_idx, test_idx in splits]
+
+
+def _score_candidate(estimator, params, n_estimators, folds):
+    """Mean walk-forward MAE of one configuration at one budget."""
+    errors = []
+    for X_train, y_train, X_test, y_test in folds:
+        model = clone(estimator).set_params(n_estimators=n_estimators, n_jobs=1, **params)
+        model.fit(X_train, y_train)
+        errors.append(mean_absolute_error(y_test, model.predict(X_test)))
+    return float(np.mean(errors))
+
+
+def successive_halving(estimator, param_space, folds, n_candidates=TUNING_CANDIDATES,
+                       min_estimators=TUNING_MIN_ESTIMATORS, max_estimators=TUNING_MAX_ESTIMATORS,
+                       factor=TUNING_HALVING_FACTOR, n_jobs=TUNING_N_JOBS, seed=RANDOM_STATE):
+    """
+    Successive halving over randomly sampled configurations.
+    Every rung scores the surviving candidates with a budget of n_estimators across a
+    process pool, keeps the best 1/factor of them and multiplies the budget by factor,
+    so weak configurations are stopped early at a small budget.
+    Returns (best_params, best_score, history).
+    """
+    candidates = list(ParameterSampler(param_space, n_iter=n_candidates, random_state=seed))
+    n_estimators = min_estimators
+    history = []
+
+    with parallel_config(backend='loky', inner_max_num_threads=1):
+        while True:
+            scores = Parallel(n_jobs=n_jobs)(
+                delayed(_score_candidate)(estimator, params, n_estimators, folds) for params in candidates
+            )
+            ranked = sorted(zip(scores, range(len(candidates))), key=lambda pair: pair[0])
+            history.append({'n_estimators': n_estimators, 'n_candidates': len(candidates),
+                            'best_MAE': ranked[0][0]})
+            print(f"  Rung n_estimators={n_estimators}: {len(candidates)} candidates, best MAE ${ranked[0][0]:.2f}")
+
+            if len(candidates) == 1 or n_estimators >= max_estimators:
+                best_score, best_index = ranked[0]
+                return {**candidates[best_index], 'n_estimators': n_estimators}, best_score, history
+
+            keep = max(1, math.ceil(len(candidates) / factor))
+            candidates = [candidates[index] for _, index in ranked[:keep]]
+            n_estimators = min(max_estimators, n_estimators * factor)
+
+
+def load_tuned_params(model_name, ticker=COMPANY_TICKER, path=TUNED_PARAMS_FILE):
+    """Returns the saved winning hyperparameters for a model, or {} if it was never tuned."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f).get(ticker, {}).get(model_name, {}).get('params', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_tuned_params(results, ticker=COMPANY_TICKER, path=TUNED_PARAMS_FILE):
+    """Merges tuning results for one ticker into the tuned-params file."""
+    try:
+        with open(path, 'r') as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        saved = {}
+    saved.setdefault(ticker, {}).update(results)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(saved, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def _tune_and_save(X, y, features, ticker, models):
+    """
+    Tunes each model of `models` ({saved name: SEARCH_SPACES key}) on walk-forward folds
+    of X and y and saves the winners under their saved names.
+    """
+    from src.machine_learning.backtesting import walk_forward_splits
+
+    folds = build_fold_cache(X, y, walk_forward_splits(len(X)))
+    results = {}
+    for name, space in models.items():
+        estimator, param_space = SEARCH_SPACES[space]
+        print(f"Tuning {name} for {ticker} with successive halving...")
+        params, score, history = successive_halving(estimator, param_space, folds)
+        print(f"  Best {name}: {params} (MAE ${score:.2f})")
+        results[name] = {
+            'params': params,
+            'MAE': score,
+            'n_rows': len(X),
+            'features': features,
+            'rungs': history,
+            'tuned_at': datetime.now().isoformat(timespec='seconds'),
+        }
+
+    save_tuned_params(results, ticker)
+    print(f"Tuned parameters saved to '{TUNED_PARAMS_FILE}'")
+    return results
+
+
+def tune_forecasting_models(processed_data=None, ticker=COMPANY_TICKER, model_names=tuple(SEARCH_SPACES)):
+    """Tunes the Random Forest and XGBoost forecasting models and saves the winners."""
+    # Imported here because forecasting_engine reads the tuned params from this module
+    from src.data_pipeline.data_processor import process_data
+    from src.machine_learning.forecasting_engine import build_lagged_features
+
+    combined_df = process_data() if processed_data is None else processed_data.copy()
+    combined_df, features = build_lagged_features(combined_df)
+    return _tune_and_save(combined_df[features], combined_df['target_price'], features, ticker,
+                          {name: name for name in model_names})
+
+
+def tune_stage2_model(processed_data=None, ticker=COMPANY_TICKER):
+    """
+    Tunes the two-stage model's price regressor on its own features (lagged KPIs, price
+    and market features) and saves the winner as STAGE2_MODEL_NAME.
+    """
+    # Imported here because two_stage_forecast reads the tuned params from this module
+    from src.data_pipeline.data_processor import process_data
+    from src.machine_learning.two_stage_forecast import build_stage2_frame
+
+    financial_df = process_data() if processed_data is None else processed_data.copy()
+    stage2_df, features, _ = build_stage2_frame(financial_df)
+    return _tune_and_save(stage2_df[features], stage2_df['target_price'], features, ticker,
+                          {STAGE2_MODEL_NAME: 'XGBoost'})
+
+if __name__ == "__main__":
+    tune_forecasting_models()
+    tune_stage2_model()
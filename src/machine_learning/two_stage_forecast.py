@@ -1,78 +1,106 @@
+import functools
+import os
+
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
+from sklearn.base import clone
 from xgboost import XGBRegressor
 from datetime import timedelta
 
-def two_stage_forecast():
+from src.data_pipeline.data_processor import COMPANY_TICKER, KPI_COLUMNS, process_data
+from src.data_pipeline.market_features import MARKET_FEATURE_COLUMNS
+from src.machine_learning.model_registry import get_registry, model_params
+from src.machine_learning.scenarios import N_SCENARIOS, quantile_bands, sample_kpi_paths, simulate_price_paths
+from src.machine_learning.training import warm_start_refit
+from src.machine_learning.trend_solver import BatchedTrendModel
+from src.machine_learning.tuning import STAGE2_MODEL_NAME, load_tuned_params
+from src.utils.config import get_setting
+from src.utils.instrumentation import stage
+
+# --- Configuration ---
+FORECAST_HORIZON = get_setting('forecasting', 'horizon', default=2)
+
+def build_stage2_frame(financial_df, kpis=KPI_COLUMNS):
     """
-    Implements a two-stage forecasting model with two separate data tables.
-    Stage 1: Predicts future KPIs from historical financial data.
-    Stage 2: Predicts future stock price using historical stock data and forecasted KPIs.
+    Builds the stage-2 training frame from the processed quarters: the next quarter's
+    price as 'target_price' and the lagged KPIs, price and market features.
+    Returns the frame, the feature columns and the market feature columns used.
     """
-    try:
-        # --- Data Loading ---
-        print("Loading and preparing data...")
+    # Financial rows already carry the closest stock price from the processing stage
+    historical_combined_df = financial_df.copy()
 
-        # Load financial data with the correct filename
-        financial_df = pd.read_csv('nvidia_financial_data_DAX.csv')
-
-        # Load stock data (with Report Date)
-        stock_df = pd.read_csv('nvda_stock_data.csv')
-        stock_df['Report Date'] = pd.to_datetime(stock_df['Report Date'])
-        stock_df.sort_values('Report Date', inplace=True)
+    # Correctly reference the stock price column and drop missing rows
+    columns_to_check = ['adjustedCloseStockPrice'] + [col for col in kpis if col in historical_combined_df.columns]
+    historical_combined_df.dropna(subset=columns_to_check, inplace=True)
 
-    except FileNotFoundError as e:
-        print(f"Error: {e}. Please ensure both files are in the same folder and have the correct names.")
-        print(f"I was looking for 'nvda_dax.csv' and 'nvda_stock_data.csv'")
-        return
-    except KeyError as e:
-        print(f"Error: Missing expected column {e}. Please check your CSV file headers.")
-        return
+    # Feature engineering for the stock price model
+    historical_combined_df['target_price'] = historical_combined_df['adjustedCloseStockPrice'].shift(-1)
 
-    # --- Data Preparation: Handle Missing Values and Create 'Report Date' ---
-    print("Checking for and removing rows with missing 'Year' or 'Quarter'...")
-    financial_df.dropna(subset=['Year', 'Quarter'], inplace=True)
+    for kpi in kpis:
+        if kpi in historical_combined_df.columns:
+            historical_combined_df[f'lagged_{kpi}'] = historical_combined_df[kpi].shift(1)
 
-    # *** IMPORTANT FIX: Clean the 'Quarter' column to remove the "Qtr " string ***
-    print("Cleaning 'Quarter' column...")
-    financial_df['Quarter'] = financial_df['Quarter'].astype(str).str.replace('Qtr ', '').astype(int)
+    historical_combined_df['lagged_adj_close'] = historical_combined_df['adjustedCloseStockPrice'].shift(1)
 
-    # Create 'Report Date' from 'Year' and 'Quarter' columns
-    print("Creating 'Report Date' from 'Year' and 'Quarter' columns...")
+    # Rolling volatility, momentum, drawdown and volume trend from the daily bars
+    market_columns = [col for col in MARKET_FEATURE_COLUMNS if col in historical_combined_df.columns]
+    for col in market_columns:
+        historical_combined_df[f'lagged_{col}'] = historical_combined_df[col].shift(1)
 
-    # Map quarter to a month to create a valid date
-    quarter_to_month = {1: '03-31', 2: '06-30', 3: '09-30', 4: '12-31'}
-    financial_df['Report Date'] = financial_df['Year'].astype(str) + '-' + financial_df['Quarter'].map(quarter_to_month).astype(str)
-    financial_df['Report Date'] = pd.to_datetime(financial_df['Report Date'], errors='coerce')
+    historical_combined_df.dropna(inplace=True)
 
-    # Remove rows with invalid dates (NaT) to prevent merge error
-    print("Removing rows where 'Report Date' is invalid...")
-    financial_df.dropna(subset=['Report Date'], inplace=True)
-    financial_df.sort_values('Report Date', inplace=True)
+    features = [f'lagged_{kpi}' for kpi in kpis if f'lagged_{kpi}' in historical_combined_df.columns] + ['lagged_adj_close']
+    features += [f'lagged_{col}' for col in market_columns]
+    return historical_combined_df, features, market_columns
 
-    # --- VERIFICATION STEP ---
-    if financial_df.empty:
-        print("\nError: The financial data DataFrame is empty after cleaning. Please check your source file for complete rows.")
-        return
+def fit_stage2_model(historical_combined_df, features, ticker=COMPANY_TICKER):
+    """
+    Trains the stage-2 XGBoost model on the full historical data, with the parameters
+    tune_stage2_model found on these features (defaults until it has run). The registry
+    loads it when the data is unchanged and continues boosting from the cached booster
+    when quarters were appended.
+    """
+    X = historical_combined_df[features]
+    y = historical_combined_df['target_price']
+    xgb_params = XGBRegressor(**{'n_estimators': 100, 'random_state': 42, **load_tuned_params(STAGE2_MODEL_NAME, ticker)})
+    return get_registry().get_or_train(
+        f'{ticker}/two_stage/stage2_xgboost', features, model_params(xgb_params), X, y,
+        train_fn=lambda X_, y_: clone(xgb_params).fit(X_, y_),
+        update_fn=functools.partial(warm_start_refit, base_model=xgb_params)
+    )
 
-    # --- Clean pre-calculated KPI columns and correctly define list ---
-    print("Cleaning pre-calculated KPI columns...")
+def two_stage_forecast(processed_data=None, ticker=COMPANY_TICKER, output_dir='.'):
+    """
+    Implements a two-stage forecasting model with two separate data tables.
+    Stage 1: Predicts future KPIs from historical financial data.
+    Stage 2: Predicts future stock price using historical stock data and forecasted KPIs.
+    Pass the frame from data_processor.process_data to skip re-parsing the inputs.
+    Cached models are kept per `ticker`; the forecast CSVs are written to `output_dir`
+    (None skips them).
+    """
+    try:
+        # --- Data Loading ---
+        # 'Report Date' parsing, KPI '%' cleaning and the stock merge are done once by the shared processor
+        print("Loading and preparing data...")
+        financial_df = process_data() if processed_data is None else processed_data.copy()
 
-    kpis_to_forecast = ['ROIC (%)', 'Gross Margin %', 'R&D as % of Revenue', 'Free Cash Flow']
+    except FileNotFoundError as e:
+        print(f"Error: {e}. Please ensure both files are in the processed data folder and have the correct names.")
+        print(f"I was looking for 'nvidia_financial_data_DAX.csv' and 'nvda_stock_data.csv'")
+        return
+    except (KeyError, ValueError) as e:
+        print(f"Error: {e}. Please check your CSV file headers and contents.")
+        return
 
+    kpis_to_forecast = KPI_COLUMNS
     for kpi in kpis_to_forecast:
         if kpi not in financial_df.columns:
-            print(f"Warning: KPI column '{kpi}' not found. Skipping cleaning for this column.")
-            continue
-
-        financial_df[kpi] = financial_df[kpi].astype(str).str.rstrip('%').replace('', np.nan)
-        financial_df[kpi] = pd.to_numeric(financial_df[kpi], errors='coerce')
+            print(f"Warning: KPI column '{kpi}' not found. Skipping this KPI.")
 
     # --- Stage 1: KPI Forecasting ---
     print("\nStage 1: Forecasting financial KPIs...")
 
-    forecast_horizon = 2
+    forecast_horizon = FORECAST_HORIZON
     financial_df['time_index'] = range(len(financial_df))
 
     kpi_forecasts = pd.DataFrame()
@@ -80,39 +108,23 @@ def two_stage_forecast():
         financial_df['Report Date'].iloc[-1] + timedelta(days=90 * (i + 1)) for i in range(forecast_horizon)
     ]
 
-    for kpi in kpis_to_forecast:
-        if kpi not in financial_df.columns:
-            continue
+    # Fit every KPI trend in one NaN-masked least-squares solve; a gap in one KPI
+    # only drops that KPI's row instead of misaligning time_index and values
+    available_kpis = [kpi for kpi in kpis_to_forecast if kpi in financial_df.columns]
+    with stage('two_stage/stage1_trends', rows_in=len(financial_df), kpis=len(available_kpis)) as metrics:
+        trend_model = BatchedTrendModel().fit(financial_df[available_kpis].to_numpy(dtype=np.float64),
+                                              time_index=financial_df['time_index'].to_numpy())
+        kpi_forecasts[available_kpis] = trend_model.forecast(forecast_horizon)
+        metrics.rows_out = len(kpi_forecasts)
 
-        model = LinearRegression()
-        X = financial_df[['time_index']].dropna()
-        y = financial_df[kpi].dropna()
-
-        if len(X) > 1 and len(y) > 1:
-            model.fit(X, y)
-            future_time_indices = np.array(range(len(financial_df), len(financial_df) + forecast_horizon)).reshape(-1, 1)
-            kpi_forecasts[kpi] = model.predict(future_time_indices)
-        else:
-            kpi_forecasts[kpi] = np.nan
-
-    kpi_forecasts.to_csv('kpi_forecast.csv', index=False)
-    print("KPI forecast saved to 'kpi_forecast.csv'")
+    if output_dir is not None:
+        kpi_forecasts.to_csv(os.path.join(output_dir, 'kpi_forecast.csv'), index=False)
+        print("KPI forecast saved to 'kpi_forecast.csv'")
 
     # --- Stage 2: Stock Price Forecasting ---
     print("\nStage 2: Forecasting stock price...")
 
-    # Merge financial and stock data using the newly created 'Report Date' column
-    historical_combined_df = pd.merge_asof(
-        financial_df,
-        stock_df,
-        left_on='Report Date',
-        right_on='Report Date',
-        direction='nearest'
-    )
-
-    # Correctly reference the stock price column and drop missing rows
-    columns_to_check = ['adjustedCloseStockPrice'] + [col for col in kpis_to_forecast if col in historical_combined_df.columns]
-    historical_combined_df.dropna(subset=columns_to_check, inplace=True)
+    historical_combined_df, features, market_columns = build_stage2_frame(financial_df, kpis_to_forecast)
 
     # --- VERIFICATION STEP ---
     if historical_combined_df.empty:
@@ -120,45 +132,44 @@ def two_stage_forecast():
         print("Please check your financial and stock data files to ensure their dates overlap.")
         return
 
-    # Feature engineering for the stock price model
-    historical_combined_df['target_price'] = historical_combined_df['adjustedCloseStockPrice'].shift(-1)
+    xgb_model = fit_stage2_model(historical_combined_df, features, ticker)
 
-    for kpi in kpis_to_forecast:
-        if kpi in historical_combined_df.columns:
-            historical_combined_df[f'lagged_{kpi}'] = historical_combined_df[kpi].shift(1)
-
-    historical_combined_df['lagged_adj_close'] = historical_combined_df['adjustedCloseStockPrice'].shift(1)
-
-    historical_combined_df.dropna(inplace=True)
-
-    features = [f'lagged_{kpi}' for kpi in kpis_to_forecast if f'lagged_{kpi}' in historical_combined_df.columns] + ['lagged_adj_close']
-    X = historical_combined_df[features]
-    y = historical_combined_df['target_price']
-
-    # Train the XGBoost model on the full historical data
-    xgb_model = XGBRegressor(n_estimators=100, random_state=42)
-    xgb_model.fit(X, y)
-
-    # Create a DataFrame for future prediction using the forecasted KPIs
+    # --- Forecast every horizon step ---
+    # Step h feeds the stage-1 KPI forecast for h and the price predicted for h-1 into the
+    # stage-2 model; the point path and all scenarios each take one predict call per step
     last_historical_row = historical_combined_df.iloc[-1]
+    last_price = last_historical_row['target_price']
+    kpi_point_path = kpi_forecasts[available_kpis].to_numpy(dtype=np.float64)
+    # Like the price, the market features enter at their latest observed values
+    last_market = financial_df[market_columns].ffill().iloc[-1].to_numpy(dtype=np.float64)
 
-    future_data = pd.DataFrame({
-        f'lagged_{kpi}': [kpi_forecasts[kpi].iloc[0]] for kpi in kpis_to_forecast if kpi in kpi_forecasts.columns
-    })
-    future_data['lagged_adj_close'] = [last_historical_row['target_price']]
-
-    predicted_stock_price = xgb_model.predict(future_data)
+    predicted_stock_price = simulate_price_paths(xgb_model, kpi_point_path[None, :, :], last_price, last_market)[0]
 
     # Save the stock price forecast
     forecast_df = pd.DataFrame({
-        'Report Date': [kpi_forecasts['Report Date'].iloc[0]],
+        'Report Date': kpi_forecasts['Report Date'],
         'Forecasted Price': predicted_stock_price
     })
 
-    forecast_df.to_csv('price_forecast.csv', index=False)
-    print("Stock price forecast saved to 'price_forecast.csv'")
+    if output_dir is not None:
+        forecast_df.to_csv(os.path.join(output_dir, 'price_forecast.csv'), index=False)
+        print("Stock price forecast saved to 'price_forecast.csv'")
+
+    # --- Scenario Simulation ---
+    # Sample KPI paths from the stage-1 residuals and push them all through stage 2
+    print(f"\nSimulating {N_SCENARIOS} KPI scenarios...")
+    with stage('two_stage/scenarios', rows_in=N_SCENARIOS, horizon=forecast_horizon) as metrics:
+        kpi_paths = sample_kpi_paths(kpi_point_path, trend_model.residuals_, n_paths=N_SCENARIOS)
+        price_paths = simulate_price_paths(xgb_model, kpi_paths, last_price, last_market)
+        metrics.rows_out = price_paths.size
+
+    bands_df = quantile_bands(kpi_forecasts['Report Date'], price_paths)
+    if output_dir is not None:
+        bands_df.to_csv(os.path.join(output_dir, 'price_forecast_bands.csv'), index=False)
+        print("Scenario quantile bands saved to 'price_forecast_bands.csv'")
 
     print("\nAll forecasts are complete.")
+    return {'kpi_forecast': kpi_forecasts, 'price_forecast': forecast_df, 'scenario_bands': bands_df}
 
 if __name__ == "__main__":
     two_stage_forecast()
\ No newline at end of file
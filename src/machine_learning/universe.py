@@ -0,0 +1,332 @@
+import contextlib
+import io
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.storage import dataset_exists, partition_path, read_dataset, read_prices, write_dataset
+from src.utils.checkpoint import Checkpoint
+from src.utils.config import get_setting, resolve_path
+from src.utils.instrumentation import process_peak_rss_mb, stage
+
+# --- Configuration ---
+COMPANY_TICKER = get_setting('company', 'ticker', default='NVDA')
+UNIVERSE_TICKERS = get_setting('universe', 'tickers', default=None) or [COMPANY_TICKER]
+UNIVERSE_FILE = get_setting('universe', 'file', default=None)
+UNIVERSE_MAX_WORKERS = get_setting('universe', 'max_workers', default=None)
+# Expected peak RSS of one worker, used to fit the worker count into physical memory
+WORKER_MEMORY_MB = get_setting('universe', 'worker_memory_mb', default=2048)
+# RLIMIT_AS cap per worker: virtual address space, which runs well above RSS once numpy,
+# BLAS and xgboost have mapped their libraries and thread arenas (None disables it)
+WORKER_ADDRESS_SPACE_MB = get_setting('universe', 'worker_address_space_mb', default=8192)
+MAX_TICKERS_PER_WORKER = get_setting('universe', 'max_tickers_per_worker', default=8)
+PROCESSED_DIR = resolve_path(get_setting('paths', 'processed_data', default='data/processed'))
+FORECASTS_DIR = resolve_path(get_setting('paths', 'forecasts', default='data/forecasts'))
+COMPARISON_FILE = os.path.join(FORECASTS_DIR, 'peer_comparison.csv')
+
+# Lines of a failed ticker's output kept in the comparison table
+LOG_TAIL_LINES = 5
+# Store partitions run_ticker writes per ticker; resumed tickers are verified against them
+TICKER_DATASETS = {
+    'all': ['moat_kpis', 'kpi_forecast', 'price_forecast', 'price_forecast_bands'],
+    'engine': ['moat_kpis'],
+    'two-stage': ['moat_kpis', 'kpi_forecast', 'price_forecast', 'price_forecast_bands'],
+}
+
+
+def parse_tickers(tickers=None, path=None):
+    """
+    Builds the ticker universe from a list and/or a file. Files hold tickers separated by
+    commas, whitespace or newlines, with '#' comments; CSVs may instead have a 'ticker'
+    column. Tickers are upper-cased and de-duplicated in order.
+    """
+    symbols = list(tickers or [])
+    if path is not None:
+        if path.lower().endswith('.csv'):
+            symbols += pd.read_csv(path)['ticker'].dropna().astype(str).tolist()
+        else:
+            with open(path, 'r') as f:
+                for line in f:
+                    symbols += re.split(r'[\s,]+', line.split('#', 1)[0])
+    return list(dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol.strip()))
+
+
+def default_universe():
+    """The universe from config.yml: universe.file when set, else universe.tickers."""
+    return parse_tickers(path=resolve_path(UNIVERSE_FILE)) if UNIVERSE_FILE else parse_tickers(UNIVERSE_TICKERS)
+
+
+def stock_csv_path(ticker):
+    """Incremental price CSV of a ticker (the company keeps its Power BI export file)."""
+    if ticker == COMPANY_TICKER:
+        from src.data_pipeline.data_processor import STOCK_DATA_FILE
+        return STOCK_DATA_FILE
+    return os.path.join(PROCESSED_DIR, 'universe', f"{ticker.lower()}_stock_data.csv")
+
+
+# --- 1. Collection ---
+
+def collect_universe(tickers, api_key=None, resume=False):
+    """
+    Fetches statements for every ticker under the shared Alpha Vantage rate limit and
+    refreshes each ticker's daily prices. Statements go to the 'financial_statements'
+    store partitioned by ticker. Each collected ticker is checkpointed; with `resume`,
+    tickers whose files are unchanged since the interrupted run are not fetched again.
+    Returns {ticker: (statement rows, price rows)}.
+    """
+    from src.data_pipeline.financial_data_collector import (API_KEY, combine_alpha_vantage_statements,
+                                                            fetch_alpha_vantage_statements)
+    from src.data_pipeline.stock_data_collector import update_stock_data
+
+    checkpoint = Checkpoint('universe_collect', resume=resume)
+    collected = {ticker: tuple(checkpoint.value(ticker)) for ticker in tickers if checkpoint.done(ticker)}
+    remaining = [ticker for ticker in tickers if ticker not in collected]
+    if collected:
+        print(f"Resuming: {len(collected)} tickers already collected.")
+
+    statements = fetch_alpha_vantage_statements(remaining, api_key or API_KEY) if remaining else {}
+    for ticker in remaining:
+        income, balance, cash_flow = statements[ticker]
+        n_statements = 0
+        if not income.empty and not balance.empty and not cash_flow.empty:
+            combined = combine_alpha_vantage_statements(income, balance, cash_flow).reset_index()
+            combined = combined.rename(columns={'ReportDate': 'Report Date'})
+            write_dataset(combined, 'financial_statements', ticker=ticker)
+            n_statements = len(combined)
+        else:
+            print(f"Warning: incomplete Alpha Vantage statements for {ticker}.")
+
+        path = stock_csv_path(ticker)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        collected[ticker] = (n_statements, len(update_stock_data(ticker, path=path)))
+        files = [path] + ([partition_path('financial_statements', ticker)] if n_statements else [])
+        checkpoint.complete(ticker, files=files, value=collected[ticker])
+    checkpoint.finish()
+    return collected
+
+
+# --- 2. Per-ticker work (runs in the pool workers) ---
+
+_started = None
+
+
+def _init_worker(n_cores, address_space_mb, started):
+    """
+    Caps the cores and address space a worker may use so the pool stays within the
+    machine, and keeps the queue it reports each ticker it starts on.
+    """
+    global _started
+    _started = started
+    os.environ['MOAT_MAX_CORES'] = str(n_cores)
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(n_cores)
+    if address_space_mb:
+        import resource
+        limit = int(address_space_mb) * 1024 * 1024
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (limit if hard == resource.RLIM_INFINITY else min(limit, hard), hard))
+
+
+def load_statements(ticker):
+    """A ticker's raw statements from the store, or the company's raw CSV."""
+    from src.data_pipeline.moat_metrics import RAW_FINANCIAL_FILE, load_raw_statements
+
+    if dataset_exists('financial_statements'):
+        statements = read_dataset('financial_statements', tickers=[ticker])
+        if not statements.empty:
+            return statements
+    if ticker == COMPANY_TICKER and os.path.exists(RAW_FINANCIAL_FILE):
+        return load_raw_statements(RAW_FINANCIAL_FILE)
+    raise FileNotFoundError(f"No statements collected for {ticker}; run with --collect first.")
+
+
+def _summarize(ticker, processed, engine, two_stage):
+    """One comparison-table row: latest moat KPIs, market features and forecasts."""
+    from src.data_pipeline.data_processor import KPI_COLUMNS
+    from src.data_pipeline.market_features import MARKET_FEATURE_COLUMNS
+
+    latest = processed.ffill().iloc[-1]
+    row = {'ticker': ticker, 'quarters': len(processed), 'Report Date': latest['Report Date'],
+           'Close': latest.get('adjustedCloseStockPrice')}
+    row.update({col: latest.get(col) for col in KPI_COLUMNS + MARKET_FEATURE_COLUMNS})
+
+    if engine:
+        best = engine['best_model']
+        row.update({'Best Model': best, 'Backtest MAE': engine['metrics'][best]['MAE'] if best else np.nan,
+                    'Engine Forecast': engine['forecast']['Forecasted Price'].iloc[0] if engine['forecast'] is not None else np.nan})
+    if two_stage:
+        final = two_stage['scenario_bands'].iloc[-1]
+        row.update({'Forecast Date': final['Report Date'],
+                    'Two-Stage Forecast': two_stage['price_forecast']['Forecasted Price'].iloc[-1],
+                    **{col: final[col] for col in two_stage['scenario_bands'].columns if col.startswith('P')}})
+        row['Expected Return (%)'] = (row['Two-Stage Forecast'] / row['Close'] - 1) * 100
+    return row
+
+
+def run_ticker(ticker, models='all'):
+    """
+    Processes and forecasts one ticker and writes its results to the ticker's store
+    partitions ('moat_kpis', 'kpi_forecast', 'price_forecast', 'price_forecast_bands').
+    Returns its comparison-table row; failures are reported in the row instead of raised,
+    so one bad ticker does not stop the universe.
+    """
+    from src.data_pipeline.data_processor import KPI_HISTORY_START, STOCK_COLUMNS, process_data
+    from src.data_pipeline.moat_metrics import compute_moat_metrics
+
+    start = time.perf_counter()
+    log = io.StringIO()
+    try:
+        with stage(f'universe/{ticker}') as metrics, contextlib.redirect_stdout(log):
+            kpis = compute_moat_metrics(load_statements(ticker))
+            if KPI_HISTORY_START is not None:
+                kpis = kpis[kpis['Statement Date'] >= pd.Timestamp(KPI_HISTORY_START)]
+            prices = read_prices(ticker, stock_csv_path(ticker), columns=STOCK_COLUMNS)
+            if prices.empty:
+                raise FileNotFoundError(f"No prices collected for {ticker}; run with --collect first.")
+            processed = process_data(financial_data=kpis.drop(columns=['ticker'], errors='ignore'), stock_data=prices)
+            write_dataset(processed, 'moat_kpis', ticker=ticker)
+
+            engine = two_stage = None
+            if models in ('all', 'engine'):
+                from src.machine_learning.forecasting_engine import run_forecasting_model
+                engine = run_forecasting_model(processed, ticker=ticker, output_dir=None)
+            if models in ('all', 'two-stage'):
+                from src.machine_learning.two_stage_forecast import two_stage_forecast
+                two_stage = two_stage_forecast(processed, ticker=ticker, output_dir=None)
+                if two_stage:
+                    write_dataset(two_stage['kpi_forecast'], 'kpi_forecast', ticker=ticker)
+                    write_dataset(two_stage['price_forecast'], 'price_forecast', ticker=ticker)
+                    write_dataset(two_stage['scenario_bands'], 'price_forecast_bands', ticker=ticker)
+            metrics.rows_out = len(processed)
+
+        row = _summarize(ticker, processed, engine, two_stage)
+        row['Status'] = 'ok' if (engine or models == 'two-stage') and (two_stage or models == 'engine') else 'no forecast'
+    except Exception as e:
+        row = {'ticker': ticker, 'Status': f"failed: {type(e).__name__}: {e}"}
+    if row['Status'] != 'ok':
+        row['Log'] = ' | '.join(log.getvalue().strip().splitlines()[-LOG_TAIL_LINES:])
+    row['Seconds'] = time.perf_counter() - start
+    row['Worker Peak RSS (MB)'] = process_peak_rss_mb()
+    return row
+
+
+def _run_reported(ticker, models):
+    # SimpleQueue.put writes synchronously, so the parent learns of the start even if this process dies
+    _started.put(ticker)
+    return run_ticker(ticker, models)
+
+
+# --- 3. Fan-out ---
+
+def plan_workers(n_tickers, max_workers=UNIVERSE_MAX_WORKERS, memory_mb=WORKER_MEMORY_MB):
+    """Worker count and cores per worker that fit both the cores and the memory budget."""
+    from src.machine_learning.training import available_cores
+
+    cores = available_cores()
+    n_workers = min(n_tickers, max_workers or cores, cores)
+    if memory_mb:
+        total_mb = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+        n_workers = min(n_workers, max(1, total_mb // int(memory_mb)))
+    n_workers = max(1, n_workers)
+    return n_workers, max(1, cores // n_workers)
+
+
+def _run_pool(tickers, models, n_workers, cores_per_worker, address_space_mb, on_row):
+    """
+    Runs tickers on one process pool, passing each finished row to `on_row`. If a worker
+    dies (e.g. at the address-space cap) the pool breaks and every unfinished ticker
+    fails with it; returns (tickers that were running then, tickers that never started).
+    """
+    context = multiprocessing.get_context('spawn')
+    started, finished = context.SimpleQueue(), set()
+    # Recycling workers needs Python 3.11+; older versions keep each worker for the whole pool
+    recycle = {'max_tasks_per_child': MAX_TICKERS_PER_WORKER} if sys.version_info >= (3, 11) else {}
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=context, initializer=_init_worker,
+                             initargs=(cores_per_worker, address_space_mb, started), **recycle) as executor:
+        futures = {executor.submit(_run_reported, ticker, models): ticker for ticker in tickers}
+        for future in as_completed(futures):
+            try:
+                row = future.result()
+            except BrokenProcessPool:
+                continue
+            except Exception as e:
+                row = {'ticker': futures[future], 'Status': f"failed: {type(e).__name__}: {e}", 'Seconds': np.nan}
+            finished.add(futures[future])
+            on_row(row)
+
+    running = set()
+    while not started.empty():
+        running.add(started.get())
+    unfinished = [ticker for ticker in tickers if ticker not in finished]
+    return [t for t in unfinished if t in running], [t for t in unfinished if t not in running]
+
+
+def run_universe(tickers, models='all', max_workers=UNIVERSE_MAX_WORKERS, memory_mb=WORKER_MEMORY_MB,
+                 output_path=COMPARISON_FILE, resume=False, address_space_mb=WORKER_ADDRESS_SPACE_MB):
+    """
+    Processes and forecasts every ticker on a process pool. Each worker gets an even share
+    of the cores and an address-space cap, and is replaced after MAX_TICKERS_PER_WORKER
+    tickers so memory does not accumulate across a long universe. Results land in
+    per-ticker store partitions; the combined comparison table (one row per ticker,
+    in universe order) is written to `output_path` and returned.
+    When a worker dies, the tickers that had not started are resubmitted on a fresh
+    pool and those that were running are retried one per pool, which singles out the
+    ticker that killed its worker; only that one is recorded as failed.
+    Every successful ticker is checkpointed with the checksums of its partitions; with
+    `resume`, tickers finished by the interrupted run are taken from the checkpoint.
+    """
+    checkpoint = Checkpoint(f'universe_{models}', resume=resume)
+    rows = {ticker: checkpoint.value(ticker) for ticker in tickers if checkpoint.done(ticker)}
+    remaining = [ticker for ticker in tickers if ticker not in rows]
+    if rows:
+        print(f"Resuming: {len(rows)} tickers already completed, {len(remaining)} to run.")
+
+    n_workers, cores_per_worker = plan_workers(max(1, len(remaining)), max_workers, memory_mb)
+    print(f"Running {len(remaining)} tickers on {n_workers} workers ({cores_per_worker} cores each)...")
+
+    def record(row):
+        rows[row['ticker']] = row
+        if row['Status'] == 'ok':
+            checkpoint.complete(row['ticker'], value=row,
+                                files=[partition_path(name, row['ticker']) for name in TICKER_DATASETS[models]])
+        print(f"[{len(rows)}/{len(tickers)}] {row['ticker']}: {row['Status']} ({row['Seconds']:.1f}s)")
+
+    with stage('universe', rows_in=len(remaining), workers=n_workers) as metrics:
+        queued, suspects = remaining, []
+        while queued:
+            running, not_started = _run_pool(queued, models, n_workers, cores_per_worker, address_space_mb, record)
+            if not running and len(not_started) == len(queued):
+                # The pool broke before any ticker started, e.g. in the worker initializer
+                for ticker in not_started:
+                    record({'ticker': ticker, 'Status': "failed: worker process could not start", 'Seconds': np.nan})
+                break
+            if running:
+                print(f"A worker process died; retrying {len(running)} running and {len(not_started)} queued tickers.")
+            suspects += running
+            queued = not_started
+
+        for ticker in suspects:
+            crashed, not_started = _run_pool([ticker], models, 1, cores_per_worker, address_space_mb, record)
+            if crashed or not_started:
+                status = "failed: worker process died"
+                if address_space_mb:
+                    status += f" (address space capped at {address_space_mb} MB)"
+                record({'ticker': ticker, 'Status': status, 'Seconds': np.nan})
+        metrics.rows_out = sum(row['Status'] == 'ok' for row in rows.values())
+
+    comparison = pd.DataFrame([rows[ticker] for ticker in tickers])
+    # Failed tickers keep the checkpoint so a --resume run retries only them
+    if all(row['Status'] == 'ok' for row in rows.values()):
+        checkpoint.finish()
+    if output_path is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        comparison.to_csv(output_path, index=False)
+        print(f"Peer comparison saved to {output_path}")
+    return comparison
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+from src.utils.config import get_setting, resolve_path
+
+# --- Configuration ---
+CHECKPOINT_DIR = resolve_path(get_setting('paths', 'checkpoints', default='data/checkpoints'))
+
+
+def hash_file(path):
+    """sha256 of a file's contents, or None if it does not exist."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def hash_path(path):
+    """sha256 of a file, or of every file under a directory (e.g. a store partition); None if missing."""
+    if not os.path.isdir(path):
+        return hash_file(path)
+    digest = hashlib.sha256()
+    for folder, subfolders, files in os.walk(path):
+        subfolders.sort()
+        for name in sorted(files):
+            file_path = os.path.join(folder, name)
+            digest.update(f"{os.path.relpath(file_path, path)}={hash_file(file_path)};".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    """
+    Durable record of the completed units of work (stages, tickers, ...) of one run.
+    Each unit stores the checksums of the files it produced and an optional
+    JSON-serializable value. With `resume=True` the record of the interrupted run is
+    kept and `done` reports a unit as complete only while its files still match their
+    checksums; otherwise the run starts from an empty record. `finish` removes the
+    record once the whole run has succeeded.
+    """
+
+    def __init__(self, name, resume=False, root=CHECKPOINT_DIR):
+        self.path = os.path.join(root, f"{name}.json")
+        self.lock = threading.Lock()
+        self.units = self._read() if resume else {}
+        if not resume:
+            self._remove()
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.units, f, indent=2, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def done(self, unit):
+        """True if `unit` completed and none of its files changed or disappeared since."""
+        entry = self.units.get(unit)
+        if entry is None:
+            return False
+        return all(checksum is not None and hash_path(path) == checksum for path, checksum in entry['files'].items())
+
+    def value(self, unit, default=None):
+        entry = self.units.get(unit)
+        return default if entry is None else entry.get('value', default)
+
+    def complete(self, unit, files=(), value=None):
+        """Records `unit` as complete together with the checksums of its output files."""
+        entry = {
+            'files': {resolve_path(path): hash_path(resolve_path(path)) for path in files},
+            'value': value,
+            'completed_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        with self.lock:
+            self.units[unit] = entry
+            self._write()
+
+    def finish(self):
+        """Drops the record after a successful run, so the next --resume starts fresh."""
+        with self.lock:
+            self.units = {}
+            self._remove()
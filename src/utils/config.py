@@ -0,0 +1,30 @@
+import os
+from functools import lru_cache
+
+import yaml
+
+# --- Configuration ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CONFIG_FILE = os.path.join(PROJECT_ROOT, 'config.yml')
+
+
+@lru_cache(maxsize=None)
+def load_config(path=CONFIG_FILE):
+    """Loads the project configuration from config.yml."""
+    with open(path, 'r') as f:
+        return yaml.safe_load(f) or {}
+
+
+def get_setting(*keys, default=None):
+    """Returns a nested config value, e.g. get_setting('company', 'ticker')."""
+    node = load_config()
+    for key in keys:
+        if not isinstance(node, dict) or key not in node:
+            return default
+        node = node[key]
+    return node
+
+
+def resolve_path(path):
+    """Resolves a path from config.yml relative to the project root."""
+    return path if os.path.isabs(path) else os.path.join(PROJECT_ROOT, path)
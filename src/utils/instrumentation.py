@@ -0,0 +1,258 @@
+import cProfile
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from src.utils.config import get_setting, resolve_path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# --- Configuration ---
+METRICS_FILE = resolve_path(get_setting('instrumentation', 'metrics_file', default='data/metrics/metrics.jsonl'))
+PROFILE_DIR = resolve_path(get_setting('instrumentation', 'profile_dir', default='data/metrics/profiles'))
+
+logger = logging.getLogger('moat.metrics')
+
+
+def _flag(env_var, *keys):
+    value = os.environ.get(env_var)
+    if value is not None:
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(get_setting('instrumentation', *keys, default=False))
+
+
+_state = {
+    'enabled': _flag('MOAT_METRICS', 'enabled'),
+    'profile': _flag('MOAT_PROFILE', 'profile'),
+    'metrics_file': os.environ.get('MOAT_METRICS_FILE', METRICS_FILE),
+    'profile_dir': PROFILE_DIR,
+    'run_id': os.environ.get('MOAT_RUN_ID') or uuid.uuid4().hex[:12],
+}
+_counter_lock = threading.Lock()
+_write_lock = threading.Lock()
+# Only one cProfile profiler may be active per process (enforced from Python 3.12 on)
+_profiler_lock = threading.Lock()
+# Per thread: the stages open on it ('stack') and those of the thread that handed it work ('inherited')
+_local = threading.local()
+
+
+def configure(enabled=None, profile=None, metrics_file=None, profile_dir=None):
+    """Overrides the config.yml/environment settings, e.g. from command-line flags."""
+    if enabled is not None:
+        _state['enabled'] = enabled
+    if profile is not None:
+        _state['profile'] = profile
+        _state['enabled'] = _state['enabled'] or profile
+    if metrics_file is not None:
+        _state['metrics_file'] = metrics_file
+    if profile_dir is not None:
+        _state['profile_dir'] = profile_dir
+    # Worker processes (joblib/loky) read the environment, so they report into the same run
+    os.environ['MOAT_METRICS'] = '1' if _state['enabled'] else '0'
+    os.environ['MOAT_PROFILE'] = '1' if _state['profile'] else '0'
+    os.environ['MOAT_RUN_ID'] = _state['run_id']
+    os.environ['MOAT_METRICS_FILE'] = _state['metrics_file'] or ''
+
+
+def is_enabled():
+    return _state['enabled']
+
+
+def is_profiling():
+    return _state['enabled'] and _state['profile']
+
+
+def _open_stages():
+    return getattr(_local, 'inherited', []) + getattr(_local, 'stack', [])
+
+
+def count(name, n=1):
+    """
+    Increments a counter (cache hits, requests, ...) of every stage open on this thread,
+    including those inherited through propagate(); counts outside any stage are dropped.
+    """
+    if not _state['enabled']:
+        return
+    open_stages = _open_stages()
+    if not open_stages:
+        return
+    with _counter_lock:
+        for metrics in open_stages:
+            metrics.counters[name] = metrics.counters.get(name, 0) + n
+
+
+def propagate(fn):
+    """
+    Wraps `fn` for a worker thread (executor.submit(propagate(fn), ...)) so its counters
+    and stages are attributed to the stages open on the submitting thread.
+    """
+    if not _state['enabled']:
+        return fn
+    open_stages = _open_stages()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_local, 'inherited', [])
+        _local.inherited = open_stages
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.inherited = previous
+    return wrapper
+
+
+def count_rows(obj):
+    """Row count of a DataFrame/array/sequence result, or None for anything else."""
+    if obj is None or isinstance(obj, (dict, str, bytes)):
+        return None
+    shape = getattr(obj, 'shape', None)
+    if shape:
+        return int(shape[0])
+    try:
+        return len(obj)
+    except TypeError:
+        return None
+
+
+def process_peak_rss_mb():
+    """
+    Peak resident set size of the whole process since it started, in MiB (None where
+    unsupported). It never decreases, so it bounds a stage's memory rather than measuring it.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(peak / (1024 * 1024 if os.uname().sysname == 'Darwin' else 1024), 1)
+
+
+class StageMetrics:
+    """Mutable record of one stage; callers set rows_out or add fields while it runs."""
+
+    def __init__(self, name, rows_in=None, **fields):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.fields = dict(fields)
+        self.counters = {}
+
+    def add(self, **fields):
+        self.fields.update(fields)
+
+
+class _DisabledStage:
+    """Shared stand-in used when instrumentation is off, so hooks cost one attribute set."""
+    rows_in = rows_out = None
+
+    def add(self, **fields):
+        pass
+
+
+_DISABLED_STAGE = _DisabledStage()
+
+
+def emit(record):
+    """Writes one metrics record as a JSON line to the metrics log and the metrics file."""
+    line = json.dumps(record, default=str)
+    logger.info(line)
+    path = _state['metrics_file']
+    if path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with _write_lock, open(path, 'a') as f:
+            f.write(line + '\n')
+
+
+@contextmanager
+def stage(name, rows_in=None, **fields):
+    """
+    Measures a pipeline stage: wall time, the CPU time of its own thread (work handed
+    to other threads or processes is not included), the process-wide peak RSS so far,
+    rows in and out, and the counters incremented while it ran on its thread (or on
+    worker threads started through propagate()). Stages nest; the record names its parent. In profile mode the
+    outermost stage of a thread is also profiled with cProfile, unless another thread's
+    stage holds the profiler. Yields a StageMetrics the caller can set rows_out on.
+    """
+    if not _state['enabled']:
+        yield _DISABLED_STAGE
+        return
+
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    open_stages = _open_stages()
+    parent = open_stages[-1].name if open_stages else None
+    metrics = StageMetrics(name, rows_in, **fields)
+
+    # cProfile cannot nest, so only a thread's outermost stage is profiled, one at a time
+    profiler = None
+    if _state['profile'] and not stack and _profiler_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+
+    stack.append(metrics)
+    started_at = datetime.now().isoformat(timespec='milliseconds')
+    # process_time() would also count every other thread's stages running concurrently
+    wall_start, cpu_start = time.perf_counter(), time.thread_time()
+    status = 'ok'
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield metrics
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _profiler_lock.release()
+        wall, cpu = time.perf_counter() - wall_start, time.thread_time() - cpu_start
+        stack.pop()
+
+        with _counter_lock:
+            counters = dict(metrics.counters)
+        record = {
+            'run_id': _state['run_id'],
+            'stage': name,
+            'parent': parent,
+            'thread': threading.current_thread().name,
+            'status': status,
+            'started_at': started_at,
+            'wall_seconds': round(wall, 4),
+            'thread_cpu_seconds': round(cpu, 4),
+            'process_peak_rss_mb': process_peak_rss_mb(),
+            'rows_in': metrics.rows_in,
+            'rows_out': metrics.rows_out,
+            'counters': counters,
+            **metrics.fields,
+        }
+        if profiler is not None:
+            os.makedirs(_state['profile_dir'], exist_ok=True)
+            profile_path = os.path.join(_state['profile_dir'], f"{_state['run_id']}_{name.replace('/', '_')}.prof")
+            profiler.dump_stats(profile_path)
+            record['profile'] = profile_path
+        emit(record)
+
+
+def instrumented(name=None):
+    """Decorator form of stage(); rows_out is taken from the return value when it has rows."""
+    def decorator(fn):
+        stage_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _state['enabled']:
+                return fn(*args, **kwargs)
+            with stage(stage_name) as metrics:
+                result = fn(*args, **kwargs)
+                metrics.rows_out = count_rows(result)
+                return result
+        return wrapper
+    return decorator
@@ -0,0 +1,247 @@
+import ast
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from src.utils.checkpoint import Checkpoint, hash_file
+from src.utils.config import CONFIG_FILE, get_setting, resolve_path
+from src.utils.instrumentation import count, is_profiling, propagate
+
+# --- Configuration ---
+STATE_FILE = os.path.join(resolve_path(get_setting('cache', 'dir', default='data/cache')), 'pipeline_state.json')
+
+logger = logging.getLogger(__name__)
+
+
+def module_source(module_name):
+    """Path of a module's source file, found without importing it."""
+    spec = importlib.util.find_spec(module_name)
+    return spec.origin if spec is not None else None
+
+
+def _package_module_source(name, package):
+    """Source file of a module inside `package`, or None; unlike find_spec it never imports parents."""
+    spec = importlib.util.find_spec(package)
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    base = os.path.join(list(spec.submodule_search_locations)[0], *name.split('.')[1:])
+    for path in (f"{base}.py", os.path.join(base, '__init__.py')):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _imported_modules(module_name, package):
+    """Modules of `package` imported anywhere in a module's source, function-level imports included."""
+    path = _package_module_source(module_name, package)
+    if path is None:
+        return set()
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+            # `from src.pkg import module` imports submodules too
+            names.update(f"{node.module}.{alias.name}" for alias in node.names)
+    return {name for name in names
+            if name.startswith(f"{package}.") and _package_module_source(name, package) is not None}
+
+
+def module_dependencies(module_names, package='src'):
+    """The given modules plus every module of `package` they import, directly or indirectly."""
+    seen, stack = set(), list(module_names)
+    while stack:
+        name = stack.pop()
+        if name not in seen:
+            seen.add(name)
+            stack.extend(_imported_modules(name, package) - seen)
+    return sorted(seen)
+
+
+class Stage:
+    """
+    One pipeline step: a callable plus the artifacts it reads and writes.
+    `code` lists the modules whose source, together with that of every src module they
+    import, counts as the stage's code version; `after`
+    adds ordering edges that are not visible from the artifacts. External stages read
+    from outside the tree (APIs), so they always run and rely on their own caches.
+    """
+
+    def __init__(self, name, fn, inputs=(), outputs=(), code=(), after=(), external=False, version=1):
+        self.name = name
+        self.fn = fn
+        self.inputs = [resolve_path(p) for p in inputs]
+        self.outputs = [resolve_path(p) for p in outputs]
+        self.code = list(code)
+        self.after = list(after)
+        self.external = external
+        self.version = version
+
+
+class PipelineDAG:
+    """
+    Runs stages in dependency order, skipping stages whose inputs and code are unchanged.
+    A stage depends on every stage that writes one of its inputs, on the stages named in
+    its `after` list, and on earlier-declared stages that write the same outputs. Ready
+    stages run concurrently on a thread pool. Fingerprints of completed stages are kept
+    in a JSON state file, and every stage of the current run is checkpointed so a failed
+    run can be resumed without rerunning the stages that already succeeded.
+    """
+
+    def __init__(self, stages, state_file=STATE_FILE):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_file = state_file
+        self.lock = threading.Lock()
+        self.dependencies = self._resolve_dependencies(stages)
+
+    @staticmethod
+    def _resolve_dependencies(stages):
+        dependencies = {stage.name: set(stage.after) for stage in stages}
+        for i, stage in enumerate(stages):
+            for other in stages:
+                if other is not stage and set(stage.inputs) & set(other.outputs):
+                    dependencies[stage.name].add(other.name)
+            # Two writers of the same file run in declaration order
+            for earlier in stages[:i]:
+                if set(stage.outputs) & set(earlier.outputs):
+                    dependencies[stage.name].add(earlier.name)
+
+        unknown = {dep for deps in dependencies.values() for dep in deps} - set(dependencies)
+        if unknown:
+            raise ValueError(f"Unknown pipeline stages in 'after': {sorted(unknown)}")
+        return dependencies
+
+    def _read_state(self):
+        try:
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_state(self, state):
+        os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.state_file), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_file)
+
+    def fingerprint(self, stage):
+        """Hash of the stage version, its code, config.yml and the contents of its inputs."""
+        digest = hashlib.sha256(f"{stage.name}:v{stage.version}".encode('utf-8'))
+        sources = [module_source(module) for module in module_dependencies(stage.code)] + [CONFIG_FILE]
+        for path in sources + stage.inputs:
+            digest.update(f"{path}={hash_file(path) if path else None};".encode('utf-8'))
+        return digest.hexdigest()
+
+    def is_stale(self, stage, state, fingerprint):
+        if stage.external:
+            return True
+        previous = state.get(stage.name)
+        if previous is None or previous['fingerprint'] != fingerprint:
+            return True
+        # Outputs that were deleted or edited since the last run are rebuilt
+        return any(hash_file(path) != previous['outputs'].get(path) for path in stage.outputs)
+
+    def _run_stage(self, stage, state, force, upstream_changed, checkpoint, resume):
+        """Runs a stage unless it is up to date; returns (ran, changed_outputs, result)."""
+        fingerprint = self.fingerprint(stage)
+        # On --resume, stages the interrupted run completed are skipped while their
+        # fingerprint and output checksums still match, external stages included
+        if resume and checkpoint.done(stage.name) and checkpoint.value(stage.name) == fingerprint:
+            count('stages_resumed')
+            logger.info(f"Skipping '{stage.name}': completed by the interrupted run.")
+            return False, False, None
+        if not force and not upstream_changed and not self.is_stale(stage, state, fingerprint):
+            count('stages_skipped')
+            logger.info(f"Skipping '{stage.name}': inputs and code unchanged.")
+            return False, False, None
+
+        logger.info(f"Running '{stage.name}'...")
+        result = stage.fn()
+        outputs = {path: hash_file(path) for path in stage.outputs}
+        with self.lock:
+            previous = state.get(stage.name, {}).get('outputs')
+            state[stage.name] = {
+                'fingerprint': fingerprint,
+                'outputs': outputs,
+                'completed_at': datetime.now().isoformat(timespec='seconds'),
+            }
+            self._write_state(state)
+        checkpoint.complete(stage.name, files=stage.outputs, value=fingerprint)
+        count('stages_run')
+        # A stage without file outputs may have changed anything, so it always counts as changed
+        return True, not stage.outputs or outputs != previous, result
+
+    def run(self, targets=None, force=False, max_workers=None, resume=False):
+        """
+        Runs the stages needed for `targets` (default: all stages) and returns
+        {stage: result} for the stages that ran. Stages without file outputs keep their
+        results in memory or caches, so they rerun whenever an upstream stage actually
+        changed its outputs; all other stages are re-checked against their inputs.
+        With `resume`, stages completed by the last failed run are not rerun. Runs of a
+        subset of the stages add to the checkpoint of the last full run instead of
+        clearing it, so a later --resume of that run still skips what they completed.
+        """
+        selected = self._with_dependencies(targets or list(self.stages))
+        partial = selected != set(self.stages)
+        state = self._read_state()
+        checkpoint = Checkpoint('pipeline', resume=resume or partial)
+        pending = {name: set(self.dependencies[name]) & selected for name in selected}
+        changed, results = set(), {}
+        # A process has one active profiler, so profiled runs execute the stages one at a time
+        if is_profiling():
+            max_workers = 1
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            running = {}
+            while pending or running:
+                for name in [n for n, deps in pending.items() if not deps]:
+                    del pending[name]
+                    stage = self.stages[name]
+                    upstream_changed = not stage.outputs and bool(self.dependencies[name] & changed)
+                    running[executor.submit(propagate(self._run_stage), stage, state, force, upstream_changed,
+                                            checkpoint, resume)] = name
+                if not running:
+                    raise ValueError(f"Pipeline stages form a cycle: {sorted(pending)}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    # Re-raise the first failure once the other running stages have finished
+                    try:
+                        did_run, did_change, result = future.result()
+                    except Exception:
+                        pending.clear()
+                        for other in running:
+                            other.cancel()
+                        raise
+                    if did_run:
+                        results[name] = result
+                    if did_change:
+                        changed.add(name)
+                    for deps in pending.values():
+                        deps.discard(name)
+        if not partial:
+            checkpoint.finish()
+        return results
+
+    def _with_dependencies(self, targets):
+        selected, stack = set(), list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in self.stages:
+                raise KeyError(f"Unknown pipeline stage '{name}'")
+            if name not in selected:
+                selected.add(name)
+                stack.extend(self.dependencies[name])
+        return selected